@@ -1,130 +1,224 @@
 import os
 import json
+import fcntl
 import logging
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
+import identity
+
 ADMIN_FILE = "admins.json"
 
+
+class AdminStore:
+    """Cache em memória do admins.json.
+
+    O arquivo só é relido quando sua assinatura (mtime, inode, tamanho) muda,
+    e as escritas são atômicas: arquivo temporário + os.replace, sob um lock
+    de thread e um flock no arquivo .lock (vale também entre processos).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._signature = None
+        self._admins = {}  # username -> {"username": ..., "password": ...}
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def _refresh(self):
+        """Recarrega o arquivo se ele mudou desde a última leitura"""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        try:
+            with open(self.path, "r") as f:
+                admins = json.load(f)
+        except FileNotFoundError:
+            admins = []
+        except Exception as e:
+            logging.error(f"Erro ao carregar admins: {e}")
+            return
+        self._admins = {a["username"]: a for a in admins}
+        self._signature = signature
+
+    def all(self):
+        """Lista (cópia) de todos os admins, na ordem do arquivo"""
+        with self._lock:
+            self._refresh()
+            return [dict(a) for a in self._admins.values()]
+
+    def get(self, username):
+        """Admin pelo nome de usuário, ou None"""
+        with self._lock:
+            self._refresh()
+            admin = self._admins.get(username)
+            return dict(admin) if admin else None
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return len(self._admins)
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, admins):
+        """Grava a lista num arquivo temporário e troca atomicamente"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".admins-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(admins, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._admins = {a["username"]: a for a in admins}
+        self._signature = self._file_signature()
+
+    @contextmanager
+    def transaction(self):
+        """Read-modify-write protegido: entrega a lista atual e grava ao sair.
+
+        Para descartar a alteração, o bloco deve levantar uma exceção.
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            admins = [dict(a) for a in self._admins.values()]
+            yield admins
+            self._write(admins)
+
+    def save(self, admins):
+        """Substitui a lista inteira de admins"""
+        with self._lock, self._file_lock():
+            self._write(admins)
+
+
+_store = AdminStore(ADMIN_FILE)
+
 # Cria o arquivo se não existir
 if not os.path.exists(ADMIN_FILE):
-    with open(ADMIN_FILE, "w") as f:
-        json.dump([{"username": "zion", "password": "zionbest"}], f)
+    _store.save([{"username": "zion", "password": "zionbest"}])
+
+
+class _NoChange(Exception):
+    """Interrompe uma transação sem gravar o arquivo"""
+
 
 def load_admins():
-    """Carrega a lista de administradores do arquivo JSON"""
+    """Carrega a lista de administradores (do cache, relendo o JSON só se mudou)"""
+    return _store.all()
+
+def get_admin(username):
+    """Retorna o admin com esse nome de usuário, ou None"""
+    return _store.get(username)
+
+def save_admins(admins):
+    """Salva a lista de administradores no arquivo JSON (escrita atômica)"""
     try:
-        with open(ADMIN_FILE, "r") as f:
-            return json.load(f)
+        _store.save(admins)
+        return True
     except Exception as e:
-        logging.error(f"Erro ao carregar admins: {e}")
-        return []
+        logging.error(f"Erro ao salvar admins: {e}")
+        return False
 
-def save_admins(admins):
-    """Salva a lista de administradores no arquivo JSON"""
+def _update_admins(change):
+    """Aplica change(admins) sob lock; change retorna False para não gravar"""
     try:
-        with open(ADMIN_FILE, "w") as f:
-            json.dump(admins, f, indent=2)
+        with _store.transaction() as admins:
+            if not change(admins):
+                raise _NoChange()
         return True
+    except _NoChange:
+        return False
     except Exception as e:
         logging.error(f"Erro ao salvar admins: {e}")
         return False
 
 def check_admin(username, password):
     """Verifica se o usuário e senha são válidos"""
-    admins = load_admins()
-    for adm in admins:
-        if adm["username"] == username and adm["password"] == password:
-            return True
-    return False
+    admin = _store.get(username)
+    return admin is not None and admin["password"] == password
 
 def add_admin(username, password, author="System"):
     """Adiciona um novo administrador"""
-    admins = load_admins()
-    if any(a["username"] == username for a in admins):
-        return False  # já existe
-    admins.append({"username": username, "password": password})
-    success = save_admins(admins)
+    def change(admins):
+        if any(a["username"] == username for a in admins):
+            return False  # já existe
+        admins.append({"username": username, "password": password})
+        return True
+    success = _update_admins(change)
     if success:
+        identity.invalidate(username)
         add_log("AddAdmin (Web)", username, author)
     return success
 
 def delete_admin(username, author="System"):
     """Remove um administrador"""
-    admins = load_admins()
-    new_admins = [a for a in admins if a["username"] != username]
-    if len(new_admins) == len(admins):
-        return False  # não existe
-    success = save_admins(new_admins)
+    def change(admins):
+        remaining = [a for a in admins if a["username"] != username]
+        if len(remaining) == len(admins):
+            return False  # não existe
+        admins[:] = remaining
+        return True
+    success = _update_admins(change)
     if success:
+        # Sessões abertas deste admin deixam de valer imediatamente
+        identity.invalidate(username)
         add_log("DelAdmin (Web)", username, author)
     return success
 
 def list_admins():
     """Lista todos os administradores (sem mostrar senhas)"""
-    admins = load_admins()
-    return [{"username": a["username"]} for a in admins]
+    return [{"username": a["username"]} for a in _store.all()]
 
 def update_admin_password(username, new_password):
     """Atualiza a senha de um administrador"""
-    admins = load_admins()
-    for adm in admins:
-        if adm["username"] == username:
-            adm["password"] = new_password
-            return save_admins(admins)
-    return False
+    def change(admins):
+        for adm in admins:
+            if adm["username"] == username:
+                adm["password"] = new_password
+                return True
+        return False
+    return _update_admins(change)
 
 def get_admin_count():
     """Retorna o número total de administradores"""
-    return len(load_admins())
+    return _store.count()
 
 def add_log(action, target, author="System"):
-    """Adiciona um log de ação administrativa"""
-    log_file = "admin_logs.json"
-    
-    # Carrega logs existentes ou cria lista vazia
-    if os.path.exists(log_file):
-        try:
-            with open(log_file, "r") as f:
-                logs = json.load(f)
-        except:
-            logs = []
-    else:
-        logs = []
-    
-    # Adiciona novo log
-    new_log = {
-        "timestamp": datetime.now().isoformat(),
-        "action": action,
-        "target": target,
-        "author": author
-    }
-    
-    logs.append(new_log)
-    
-    # Mantém apenas os últimos 100 logs
-    if len(logs) > 100:
-        logs = logs[-100:]
-    
-    # Salva logs
-    try:
-        with open(log_file, "w") as f:
-            json.dump(logs, f, indent=2)
-        logging.info(f"Log adicionado: {action} - {target} por {author}")
-    except Exception as e:
-        logging.error(f"Erro ao salvar log: {e}")
-
-def get_logs(limit=50):
-    """Retorna os logs mais recentes"""
-    log_file = "admin_logs.json"
-    
-    if not os.path.exists(log_file):
-        return []
-    
+    """Adiciona um log de ação administrativa (tabela admin_logs, gravação em lote)"""
+    import audit_log
+    audit_log.record(action, target, author)
+    logging.info(f"Log adicionado: {action} - {target} por {author}")
+
+def get_logs(limit=50, **filters):
+    """Retorna os logs mais recentes (do mais novo para o mais antigo)"""
+    return get_logs_page(limit, **filters)[0]
+
+def get_logs_page(limit=50, before_id=None, action=None, author=None):
+    """Página de logs filtrada: retorna (logs, before_id da próxima página)"""
+    import audit_log
     try:
-        with open(log_file, "r") as f:
-            logs = json.load(f)
-        return logs[-limit:] if len(logs) > limit else logs
+        return audit_log.query_logs(limit, before_id=before_id, action=action, author=author)
     except Exception as e:
         logging.error(f"Erro ao carregar logs: {e}")
-        return []
\ No newline at end of file
+        return [], None
@@ -1,92 +1,161 @@
 import os
+import io
+import csv
+import json
+import hashlib
 import logging
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, session
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
+import click
+from flask import Flask, Response, render_template, request, jsonify, flash, redirect, url_for, session, stream_with_context
+from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy import text
 from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import datetime, timedelta
 
-class Base(DeclarativeBase):
-    pass
+import ban_cache
+import ban_events
+import ban_import
+import ban_repository
+import ban_version
+import identity
+import metrics
+import profiling
+from extensions import db, login_manager
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# Maximum number of player IDs accepted by POST /api/bans/check
+BATCH_CHECK_MAX = int(os.environ.get("BATCH_CHECK_MAX", "5000"))
 
-# Database configuration
-database_url = os.environ.get("DATABASE_URL")
-if not database_url:
-    raise ValueError("DATABASE_URL environment variable is not set!")
+# Page size for GET /api/bans (default and upper bound for ?limit=)
+BAN_PAGE_DEFAULT = int(os.environ.get("BAN_PAGE_DEFAULT", "100"))
+BAN_PAGE_MAX = int(os.environ.get("BAN_PAGE_MAX", "1000"))
 
-app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+# Rows per page of the index ban table (first render and /bans/table)
+INDEX_PAGE_SIZE = int(os.environ.get("INDEX_PAGE_SIZE", "50"))
+
+# Page size for GET /api/bans/changes, and how many seconds a change must age
+# before it is served (a transaction stamps updated_at before it commits, so
+# the newest rows are held back until slower concurrent commits have landed).
+# Ban writes cannot run longer than ban_version.BAN_WRITE_MAX_SECONDS, so the
+# window must be above that; the default adds a margin for clock differences.
+BAN_CHANGES_DEFAULT = int(os.environ.get("BAN_CHANGES_DEFAULT", "500"))
+BAN_CHANGES_MAX = int(os.environ.get("BAN_CHANGES_MAX", "5000"))
+BAN_CHANGES_SETTLE = float(os.environ.get("BAN_CHANGES_SETTLE", str(ban_version.BAN_WRITE_MAX_SECONDS + 5)))
 
-# Initialize extensions
-db = SQLAlchemy(model_class=Base)
-db.init_app(app)
+# Where the dashboard opens the ban change stream (see ban_stream.py). Unset:
+# the stream server on BAN_STREAM_PORT of the host serving the page.
+BAN_STREAM_URL = os.environ.get("BAN_STREAM_URL")
 
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
-login_manager.login_message = 'Você precisa fazer login para acessar esta página.'
-login_manager.login_message_category = 'warning'
+# Rows fetched per database round trip by GET /api/bans/export
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "1000"))
 
-with app.app_context():
-    # Make sure to import the models here or their tables won't be created
-    import models  # noqa: F401
+# Bulk imports of more players than this publish a single resync event
+# instead of one event per ban
+BULK_EVENT_LIMIT = int(os.environ.get("BULK_EVENT_LIMIT", "100"))
 
-    db.create_all()
+def create_app():
+    """Build and configure the Flask app.
     
-    # Create default admin if no staff exists
-    from models import Staff
-    if not Staff.query.first():
-        admin = Staff(
-            username='admin',
-            email='admin@game.com',
-            is_admin=True
-        )
-        admin.set_password('admin123')
-        db.session.add(admin)
-        db.session.commit()
-        logging.info('Created default admin user (admin/admin123)')
+    Nothing here connects to the database: the engine opens its first
+    connection on the first query. Schema creation and seeding are explicit
+    (flask --app app init-db / seed, or init_database()).
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    
+    # Database configuration
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable is not set!")
+    
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    
+    # Initialize extensions
+    db.init_app(app)
+    
+    login_manager.init_app(app)
+    login_manager.login_view = 'login'
+    login_manager.login_message = 'Você precisa fazer login para acessar esta página.'
+    login_manager.login_message_category = 'warning'
+    
+    # Request latency, status and SQL statement counts for /metrics
+    metrics.init_app(app)
+    # Slow-statement log and sampled request profiles (see profiling.py)
+    profiling.init_app(app)
+    
+    if BAN_CHANGES_SETTLE <= ban_version.BAN_WRITE_MAX_SECONDS:
+        logging.warning(f"BAN_CHANGES_SETTLE ({BAN_CHANGES_SETTLE:g}s) should exceed BAN_WRITE_MAX_SECONDS "
+                        f"({ban_version.BAN_WRITE_MAX_SECONDS:g}s), or /api/bans/changes can skip slow commits")
+    
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    return app
+
+def init_schema():
+    """Create tables and indexes and import legacy data (idempotent)"""
+    with app.app_context():
+        db.create_all()
+    
+        # create_all() skips indexes on tables that already exist
+        from models import ensure_indexes
+        ensure_indexes()
+    
+        # Trigram (PostgreSQL) or n-gram (other databases) index for player search
+        from ban_search import ensure_search_index
+        ensure_search_index()
+    
+        # Counter row behind the ETags of the ban endpoints
+        ban_version.ensure_version_row()
+    
+        # Move the old admin_logs.json history into the audit table
+        from audit_log import import_legacy_logs
+        import_legacy_logs()
+
+def seed_defaults():
+    """Create the default admin if no staff exists (idempotent)"""
+    with app.app_context():
+        # Create default admin if no staff exists
+        from models import Staff
+        if not Staff.query.first():
+            admin = Staff(
+                username='admin',
+                email='admin@game.com',
+                is_admin=True
+            )
+            admin.set_password('admin123')
+            db.session.add(admin)
+            db.session.commit()
+            logging.info('Created default admin user (admin/admin123)')
+
+def init_database():
+    """All one-time setup: init_schema() then seed_defaults()"""
+    init_schema()
+    seed_defaults()
+
+@click.command('init-db')
+def init_db_command():
+    """Create tables and indexes, import legacy audit logs."""
+    init_schema()
+    click.echo('Database schema is up to date.')
+
+@click.command('seed')
+def seed_command():
+    """Create the default admin account if no staff exists."""
+    seed_defaults()
+    click.echo('Seed data is in place.')
+
+app = create_app()
+
+# Register the models (and their mapper events) with the extensions
+import models  # noqa: F401,E402
 
 @login_manager.user_loader
 def load_user(user_id):
-    # Import locally to avoid circular import
-    from admin_manager import load_admins
-    from models import Staff
-    
-    # Primeiro tenta carregar do arquivo JSON
-    admins = load_admins()
-    for admin in admins:
-        if admin["username"] == user_id:
-            class MockUser:
-                def __init__(self, username):
-                    self.id = username
-                    self.username = username
-                    self.is_admin = True
-                    self.is_active = True
-                    
-                def is_authenticated(self):
-                    return True
-                    
-                def is_anonymous(self):
-                    return False
-                    
-                def get_id(self):
-                    return self.id
-            return MockUser(user_id)
-    
-    # Se não encontrou no JSON, tenta no banco de dados
-    try:
-        return Staff.query.get(int(user_id))
-    except (ValueError, TypeError):
-        return None
+    # Cached: admins.json / the staff table are only read on a miss
+    return identity.load(user_id)
 
 
 # Authentication routes
@@ -110,25 +179,7 @@ def login():
         
         # Primeiro verifica o arquivo JSON de admins
         if check_admin(username, password):
-            # Create a mock user object for Flask-Login
-            class MockUser:
-                def __init__(self, username):
-                    self.id = username
-                    self.username = username
-                    self.is_admin = True
-                    self.is_active = True
-                    
-                def is_authenticated(self):
-                    return True
-                    
-                def is_anonymous(self):
-                    return False
-                    
-                def get_id(self):
-                    return self.id
-            
-            user = MockUser(username)
-            login_user(user, remember=True)
+            login_user(identity.PanelUser.for_admin(username), remember=True)
             flash(f'Bem-vindo, {username}!', 'success')
             
             # Redirect to next page or home
@@ -139,7 +190,7 @@ def login():
         staff = Staff.query.filter_by(username=username).first()
         
         if staff and staff.check_password(password) and staff.is_active:
-            login_user(staff, remember=True)
+            login_user(identity.PanelUser.for_staff(staff), remember=True)
             flash(f'Bem-vindo, {staff.username}!', 'success')
             
             # Redirect to next page or home
@@ -159,52 +210,210 @@ def logout():
     flash(f'Logout realizado com sucesso. Até logo, {username}!', 'info')
     return redirect(url_for('login'))
 
+# Conditional GET helpers (ETags derived from the ban-set version)
+def _not_modified(etag, weak=False):
+    """304 response if the client's If-None-Match already has etag, else None"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=weak)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return None
+
+def _with_etag(response, etag, weak=False):
+    """Tag a 200 response so clients can revalidate it with If-None-Match"""
+    response.set_etag(etag, weak=weak)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _listing_etag(prefix):
+    """Tag of a ban listing: ban-set version, next lapse and query string.
+
+    Bans also leave the listing (and the counters) by lapsing, which does not
+    bump the version, so the earliest pending expiry is part of the tag. The
+    tag is weak because time_remaining in the body drifts between lapses.
+    """
+    next_expiry = ban_repository.next_expiry()
+    lapse = int(next_expiry.timestamp()) if next_expiry else 0
+    query = hashlib.sha1(request.query_string).hexdigest()[:16]
+    return f'{prefix}-{ban_version.current()}-{lapse}-{query}'
+
+# Health check for the process supervisor / load balancer (no login)
+@app.route('/healthz')
+def healthz():
+    """Liveness of this web worker and reachability of the database"""
+    try:
+        db.session.execute(text('SELECT 1'))
+        database = 'ok'
+    except Exception as e:
+        logging.error(f"Health check database error: {e}")
+        database = 'error'
+    finally:
+        db.session.remove()
+    healthy = database == 'ok'
+    return jsonify({
+        'status': 'ok' if healthy else 'error',
+        'database': database,
+        'pid': os.getpid()
+    }), 200 if healthy else 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics of the web workers (see metrics.py)"""
+    if not metrics.authorized(request.headers.get('Authorization')):
+        return Response('Não autorizado\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 # Main routes
 @app.route('/')
 @login_required
 def index():
     """Main page with game ban management interface"""
-    from models import GameBan
-    bans = GameBan.query.filter_by(is_active=True).order_by(GameBan.created_at.desc()).all()
-    total_bans = len(bans)
-    active_bans = len([b for b in bans if not b.is_expired()])
-    return render_template('index.html', bans=bans, total_bans=total_bans, active_bans=active_bans)
+    bans, next_cursor = ban_repository.list_bans_page({'limit': INDEX_PAGE_SIZE})
+    counts = ban_repository.ban_counts()
+    return render_template('index.html', bans=bans, next_cursor=next_cursor,
+                           total_bans=counts['total'], active_bans=counts['active'],
+                           counted_at=datetime.now().isoformat(),
+                           stream_url=_ban_stream_url())
+
+def _ban_stream_url():
+    if BAN_STREAM_URL:
+        return BAN_STREAM_URL
+    from ban_stream import BAN_STREAM_PORT
+    return f"{request.scheme}://{request.host.split(':')[0]}:{BAN_STREAM_PORT}/api/bans/stream"
+
+@app.route('/bans/row/<int:ban_id>')
+@login_required
+def ban_row(ban_id):
+    """One row of the index ban table, for patching it from the change stream"""
+    ban = ban_repository.get_ban(ban_id)
+    if ban is None or not ban.is_active:
+        return '', 404
+    return render_template('_ban_rows.html', bans=[ban])
+
+@app.route('/bans/table')
+@login_required
+def bans_table():
+    """Rows of the index ban table, one page at a time.
+
+    Without a cursor this is a refresh of the first page and also carries the
+    summary counters. ?format=html returns the bare <tr> fragment with the
+    next cursor in the X-Next-Cursor header; the default is a JSON envelope.
+    """
+    try:
+        cursor = request.args.get('cursor')
+        try:
+            filters = {
+                'limit': INDEX_PAGE_SIZE,
+                'cursor': ban_repository.decode_cursor(cursor) if cursor else None
+            }
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        as_html = request.args.get('format') == 'html'
+        etag = _listing_etag('table')
+        not_modified = _not_modified(etag, weak=True)
+        if not_modified:
+            return not_modified
+        
+        bans, next_cursor = ban_repository.list_bans_page(filters)
+        html = render_template('_ban_rows.html', bans=bans)
+        
+        if as_html:
+            response = app.response_class(html, mimetype='text/html')
+            response.headers['X-Next-Cursor'] = next_cursor or ''
+            return _with_etag(response, etag, weak=True)
+        
+        result = {
+            'success': True,
+            'html': html,
+            'count': len(bans),
+            'next_cursor': next_cursor
+        }
+        if not cursor:
+            counts = ban_repository.ban_counts()
+            result['total_bans'] = counts['total']
+            result['active_bans'] = counts['active']
+            result['counted_at'] = datetime.now().isoformat()
+        return _with_etag(jsonify(result), etag, weak=True)
+    except Exception as e:
+        logging.error(f"Error rendering ban table: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Query string parsing for GET /api/bans
+def _parse_bool(value):
+    if value is None or value == '':
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f'Valor booleano inválido: {value}')
+
+def _parse_datetime(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Data inválida: {value}')
+
+def _parse_ban_filters(args):
+    """Read listing filters from the query string; raises ValueError on bad input"""
+    try:
+        limit = int(args.get('limit', BAN_PAGE_DEFAULT))
+    except ValueError:
+        raise ValueError('Limite inválido')
+    order = args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('Ordem inválida (use asc ou desc)')
+    cursor = args.get('cursor')
+    return {
+        'limit': max(1, min(limit, BAN_PAGE_MAX)),
+        'order': order,
+        'cursor': ban_repository.decode_cursor(cursor) if cursor else None,
+        'ban_type': args.get('ban_type') or None,
+        'expired': _parse_bool(args.get('expired')),
+        'banned_by': args.get('banned_by') or None,
+        'created_after': _parse_datetime(args.get('created_after')),
+        'created_before': _parse_datetime(args.get('created_before')),
+    }
 
 # API routes for ban management
 @app.route('/api/bans', methods=['GET'])
 @login_required
 def api_get_bans():
-    """API endpoint to get all active bans"""
-    from models import GameBan
+    """API endpoint to list active bans, one keyset page at a time"""
     try:
-        bans = GameBan.query.filter_by(is_active=True).order_by(GameBan.created_at.desc()).all()
-        ban_list = []
-        
-        for ban in bans:
-            ban_data = {
-                'id': ban.id,
-                'player_id': ban.player_id,
-                'player_name': ban.player_name,
-                'reason': ban.reason,
-                'ban_type': ban.ban_type,
-                'is_expired': ban.is_expired(),
-                'created_at': ban.created_at.isoformat(),
-                'banned_by': ban.staff_member.username
-            }
-            
-            if ban.ban_type == 'temporary' and ban.expires_at:
-                ban_data['expires_at'] = ban.expires_at.isoformat()
-                remaining = ban.time_remaining()
-                if remaining:
-                    ban_data['time_remaining'] = str(remaining)
-            
-            ban_list.append(ban_data)
+        try:
+            filters = _parse_ban_filters(request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
-        return jsonify({
+        etag = _listing_etag('bans')
+        not_modified = _not_modified(etag, weak=True)
+        if not_modified:
+            return not_modified
+        
+        bans, next_cursor = ban_repository.list_bans_page(filters)
+        ban_list = [ban.to_dict() for ban in bans]
+        
+        return _with_etag(jsonify({
             'success': True,
             'bans': ban_list,
-            'total': len(ban_list)
-        })
+            'total': len(ban_list),
+            'limit': filters['limit'],
+            'next_cursor': next_cursor
+        }), etag, weak=True)
     except Exception as e:
         logging.error(f"Error getting bans: {e}")
         return jsonify({
@@ -212,11 +421,91 @@ def api_get_bans():
             'error': str(e)
         }), 500
 
+EXPORT_CSV_HEADER = ['ID', 'Player ID', 'Player Name', 'Reason', 'Ban Type',
+                     'Created At', 'Expires At', 'Banned By']
+
+def _export_csv(rows):
+    """Yield CSV text, one chunk per EXPORT_CHUNK_SIZE rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_HEADER)
+    for count, ban in enumerate(rows, 1):
+        writer.writerow([
+            ban.id,
+            ban.player_id,
+            ban.player_name or '',
+            ban.reason,
+            ban.ban_type,
+            ban.created_at.isoformat(),
+            ban.expires_at.isoformat() if ban.expires_at else '',
+            ban.banned_by
+        ])
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _export_ndjson(rows):
+    """Yield one JSON document per line"""
+    for ban in rows:
+        yield json.dumps(ban.to_dict(), ensure_ascii=False) + '\n'
+
+EXPORT_FORMATS = {
+    'csv': (_export_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (_export_ndjson, 'application/x-ndjson; charset=utf-8'),
+}
+
+@app.route('/api/bans/export', methods=['GET'])
+@login_required
+def api_export_bans():
+    """API endpoint to stream every matching ban as CSV or NDJSON"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'error': 'Formato inválido (use csv ou ndjson)'
+        }), 400
+    try:
+        filters = _parse_ban_filters(request.args)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    serialize, content_type = EXPORT_FORMATS[export_format]
+    
+    def generate():
+        try:
+            yield from serialize(ban_repository.iter_bans(filters, EXPORT_CHUNK_SIZE))
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated file
+            logging.error(f"Error exporting bans: {e}")
+            db.session.rollback()
+    
+    filename = f"bans_export_{datetime.now():%Y%m%d_%H%M%S}.{export_format}"
+    return Response(stream_with_context(generate()), content_type=content_type, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+        # Keep reverse proxies from buffering the whole export
+        'X-Accel-Buffering': 'no'
+    })
+
+def _current_staff_id():
+    """Staff id recorded as banned_by for the logged-in user"""
+    # Resolved with the session identity (cached), so usually no query
+    if current_user.staff_id is not None:
+        return current_user.staff_id
+    # For JSON admins, find or create a staff record in the ban's transaction
+    staff_id = ban_import.staff_id_for(db.session, current_user.username)
+    identity.invalidate(current_user.username)
+    return staff_id
+
 @app.route('/api/bans', methods=['POST'])
 @login_required
 def api_add_ban():
     """API endpoint to add a game ban"""
-    from models import GameBan, Staff
     try:
         data = request.get_json()
         
@@ -238,14 +527,6 @@ def api_add_ban():
                 'error': 'ID do jogador é obrigatório'
             }), 400
         
-        # Check if player is already banned
-        existing_ban = GameBan.query.filter_by(player_id=str(player_id), is_active=True).first()
-        if existing_ban and not existing_ban.is_expired():
-            return jsonify({
-                'success': False,
-                'error': 'Jogador já está banido'
-            }), 409
-        
         # Calculate expiration for temporary bans
         expires_at = None
         if ban_type == 'temporary' and expires_in_hours:
@@ -257,41 +538,32 @@ def api_add_ban():
                     'error': 'Tempo de expiração inválido'
                 }), 400
         
-        # Get banned_by_id (handle both JSON admin and DB staff)
-        banned_by_id = None
-        if hasattr(current_user, 'id') and isinstance(current_user.id, int):
-            banned_by_id = current_user.id
-        else:
-            # For JSON admins, find or create a staff record
-            staff = Staff.query.filter_by(username=current_user.username).first()
-            if not staff:
-                staff = Staff(
-                    username=current_user.username,
-                    email=f"{current_user.username}@admin.local",
-                    is_admin=True
-                )
-                staff.set_password('temp_password')
-                db.session.add(staff)
-                db.session.commit()
-            banned_by_id = staff.id
-        
-        # Create new ban
-        new_ban = GameBan(
-            player_id=str(player_id),
-            player_name=player_name,
-            reason=reason,
-            ban_type=ban_type,
-            expires_at=expires_at,
-            banned_by_id=banned_by_id
-        )
-        
-        db.session.add(new_ban)
+        banned_by_id = _current_staff_id()
+        
+        # Create new ban; the unique index turns a concurrent duplicate into None
+        ban_id = ban_import.create_ban(db.session, {
+            'player_id': str(player_id),
+            'player_name': player_name,
+            'reason': reason,
+            'ban_type': ban_type,
+            'expires_at': expires_at,
+            'banned_by_id': banned_by_id
+        })
+        if ban_id is None:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': 'Jogador já está banido'
+            }), 409
+        
+        ban_events.publish('created', ban_id, str(player_id))
+        ban_version.bump()
         db.session.commit()
         
         return jsonify({
             'success': True,
             'message': f'Jogador {player_id} foi banido com sucesso',
-            'ban_id': new_ban.id
+            'ban_id': ban_id
         })
             
     except Exception as e:
@@ -302,6 +574,82 @@ def api_add_ban():
             'error': str(e)
         }), 500
 
+@app.route('/api/bans/bulk', methods=['POST'])
+@login_required
+def api_bulk_add_bans():
+    """API endpoint to ban many players at once from a CSV or NDJSON file"""
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            body = upload.read()
+            import_format = request.args.get('format') or ban_import.detect_format(upload.mimetype, upload.filename)
+        else:
+            body = request.get_data()
+            import_format = request.args.get('format') or ban_import.detect_format(request.mimetype)
+        
+        if import_format not in ban_import.FORMATS:
+            return jsonify({
+                'success': False,
+                'error': 'Formato inválido (use csv ou ndjson)'
+            }), 400
+        if not body:
+            return jsonify({
+                'success': False,
+                'error': 'Arquivo vazio'
+            }), 400
+        
+        try:
+            records = ban_import.parse(body, import_format)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        banned_by_id = _current_staff_id()
+        # Commits batch by batch; a failed batch stops the import
+        results, created = ban_import.import_bans(db.session, records, banned_by_id, BULK_EVENT_LIMIT)
+        summary = ban_import.summarize(results)
+        
+        if summary['failed']:
+            return jsonify({
+                'success': False,
+                'error': 'Importação interrompida; as linhas com status failed não foram gravadas',
+                'summary': summary,
+                'results': results
+            }), 500
+        
+        return jsonify({
+            'success': True,
+            'summary': summary,
+            'results': results
+        })
+            
+    except Exception as e:
+        logging.error(f"Error importing bans: {e}")
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _deactivate_ban(ban):
+    """Lift an active ban in the current transaction; False if it was already lifted.
+
+    The conditional UPDATE makes concurrent removals of one ban publish a
+    single 'removed' event. The caller commits.
+    """
+    from models import GameBan
+    lifted = (db.session.query(GameBan)
+              .filter(GameBan.id == ban.id, GameBan.is_active == True)
+              .update({GameBan.is_active: False, GameBan.updated_at: datetime.now()},
+                      synchronize_session=False))
+    if not lifted:
+        return False
+    ban_events.publish('removed', ban.id, ban.player_id, ban.expires_at)
+    ban_version.bump()
+    return True
+
 @app.route('/api/bans/<int:ban_id>', methods=['DELETE'])
 @login_required
 def api_remove_ban(ban_id):
@@ -310,8 +658,12 @@ def api_remove_ban(ban_id):
     try:
         ban = GameBan.query.get_or_404(ban_id)
         
-        ban.is_active = False
-        ban.updated_at = datetime.now()
+        if not _deactivate_ban(ban):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': 'Ban já foi removido'
+            }), 409
         db.session.commit()
         
         return jsonify({
@@ -327,53 +679,231 @@ def api_remove_ban(ban_id):
             'error': str(e)
         }), 500
 
+def _ban_check_payload(player_id, ban):
+    """Build the per-player response of the ban check endpoints"""
+    result = {
+        'player_id': player_id,
+        'is_banned': ban is not None,
+        'ban_info': None
+    }
+    
+    if ban:
+        result['ban_info'] = {
+            'id': ban.id,
+            'reason': ban.reason,
+            'ban_type': ban.ban_type,
+            'created_at': ban.created_at.isoformat(),
+            'banned_by': ban.banned_by
+        }
+        
+        if ban.ban_type == 'temporary' and ban.expires_at:
+            result['ban_info']['expires_at'] = ban.expires_at.isoformat()
+            remaining = ban.time_remaining()
+            if remaining:
+                result['ban_info']['time_remaining'] = str(remaining)
+    
+    return result
+
 @app.route('/api/bans/check/<player_id>', methods=['GET'])
 @login_required
 def api_check_ban(player_id):
     """API endpoint to check if a player is banned"""
-    from models import GameBan
     try:
-        ban = GameBan.query.filter_by(player_id=str(player_id), is_active=True).first()
+        version = ban_version.current()
+        ban = ban_cache.get_active_ban(player_id, version)
+        # The ban id also changes the tag when a ban lapses before the sweeper runs
+        etag = f'check-{version}-{ban.id if ban else 0}'
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
         
-        is_banned = ban is not None and not ban.is_expired()
+        result = {'success': True}
+        result.update(_ban_check_payload(player_id, ban))
+        return _with_etag(jsonify(result), etag)
         
-        result = {
+    except Exception as e:
+        logging.error(f"Error checking ban: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/bans/check', methods=['POST'])
+@login_required
+def api_check_bans_batch():
+    """API endpoint to check many players at once (e.g. a whole lobby)"""
+    try:
+        data = request.get_json(silent=True)
+        player_ids = data.get('player_ids') if isinstance(data, dict) else None
+        
+        if not isinstance(player_ids, list) or not player_ids:
+            return jsonify({
+                'success': False,
+                'error': 'Lista player_ids é obrigatória'
+            }), 400
+        
+        if len(player_ids) > BATCH_CHECK_MAX:
+            return jsonify({
+                'success': False,
+                'error': f'Máximo de {BATCH_CHECK_MAX} jogadores por requisição'
+            }), 400
+        
+        if not all(isinstance(pid, (str, int)) and str(pid) for pid in player_ids):
+            return jsonify({
+                'success': False,
+                'error': 'IDs de jogador inválidos'
+            }), 400
+        
+        bans = ban_cache.get_active_bans(player_ids)
+        results = {pid: _ban_check_payload(pid, ban) for pid, ban in bans.items()}
+        
+        return jsonify({
             'success': True,
-            'player_id': player_id,
-            'is_banned': is_banned,
-            'ban_info': None
-        }
+            'results': results,
+            'total': len(results),
+            'banned': sum(1 for r in results.values() if r['is_banned'])
+        })
         
-        if is_banned:
-            result['ban_info'] = {
-                'id': ban.id,
-                'reason': ban.reason,
-                'ban_type': ban.ban_type,
-                'created_at': ban.created_at.isoformat(),
-                'banned_by': ban.staff_member.username
-            }
-            
-            if ban.ban_type == 'temporary' and ban.expires_at:
-                result['ban_info']['expires_at'] = ban.expires_at.isoformat()
-                remaining = ban.time_remaining()
-                if remaining:
-                    result['ban_info']['time_remaining'] = str(remaining)
+    except Exception as e:
+        logging.error(f"Error checking bans in batch: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _change_entry(ban):
+    """One change-feed entry: the ban itself, or a tombstone once it is inactive"""
+    if ban.is_active:
+        data = ban.to_dict()
+        data['updated_at'] = ban.updated_at.isoformat()
+        return {'op': 'upsert', 'ban': data}
+    
+    expired = (ban.ban_type == 'temporary' and ban.expires_at is not None
+               and ban.expires_at <= ban.updated_at)
+    return {
+        'op': 'delete',
+        'id': ban.id,
+        'player_id': ban.player_id,
+        'cause': 'expired' if expired else 'removed',
+        'updated_at': ban.updated_at.isoformat()
+    }
+
+@app.route('/api/bans/changes', methods=['GET'])
+@login_required
+def api_ban_changes():
+    """API endpoint with the bans created, updated, removed or expired since a cursor.
+    
+    Start without ?since= to replay the whole table; keep passing back
+    next_cursor to stay in sync. Removed and expired bans come as tombstones.
+    """
+    try:
+        since = request.args.get('since')
+        try:
+            after = ban_repository.decode_change_cursor(since) if since else None
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        limit = max(1, min(request.args.get('limit', BAN_CHANGES_DEFAULT, type=int), BAN_CHANGES_MAX))
+        
+        until = datetime.now() - timedelta(seconds=BAN_CHANGES_SETTLE)
+        rows, has_more = ban_repository.list_changes(after, limit, until)
         
-        return jsonify(result)
+        return jsonify({
+            'success': True,
+            'changes': [_change_entry(ban) for ban in rows],
+            'next_cursor': ban_repository.encode_change_cursor(rows[-1]) if rows else since,
+            'has_more': has_more
+        })
+    except Exception as e:
+        logging.error(f"Error listing ban changes: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _snapshot_response(kind, filename):
+    """Serve a ban snapshot file, built at most once per ban-set version"""
+    from ban_snapshot import builder
+    try:
+        etag = f'{kind}-{ban_version.current()}'
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
         
+        version, data = builder.get(kind)
+        response = app.response_class(data, mimetype='application/gzip')
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response.headers['X-Ban-Set-Version'] = str(version)
+        return _with_etag(response, f'{kind}-{version}')
     except Exception as e:
-        logging.error(f"Error checking ban: {e}")
+        logging.error(f"Error building ban {kind}: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/api/bans/snapshot', methods=['GET'])
+@login_required
+def api_ban_snapshot():
+    """API endpoint with every banned player ID and expiry (binary, gzip; see ban_snapshot.py)"""
+    return _snapshot_response('snapshot', 'bans.snapshot.gz')
+
+@app.route('/api/bans/snapshot/bloom', methods=['GET'])
+@login_required
+def api_ban_snapshot_bloom():
+    """API endpoint with a Bloom filter of the banned player IDs (see ban_snapshot.py)"""
+    return _snapshot_response('bloom', 'bans.bloom.gz')
+
+@app.route('/api/bans/search', methods=['GET'])
+@login_required
+def api_search_bans():
+    """API endpoint to search active bans by player ID or name (ranked, fuzzy)"""
+    import ban_search
+    try:
+        term = request.args.get('q', '').strip()
+        if not term:
+            return jsonify({
+                'success': False,
+                'error': 'Parâmetro q é obrigatório'
+            }), 400
+        
+        limit = request.args.get('limit', 10, type=int)
+        results = []
+        for ban, score in ban_search.search(term, limit):
+            ban_data = ban.to_dict()
+            ban_data['score'] = round(score, 4)
+            results.append(ban_data)
+        
+        return jsonify({
+            'success': True,
+            'query': term,
+            'results': results,
+            'total': len(results)
+        })
+    except Exception as e:
+        logging.error(f"Error searching bans: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/sweeper/stats', methods=['GET'])
+@login_required
+def api_sweeper_stats():
+    """API endpoint with the expired-ban sweeper counters of this process"""
+    from ban_sweeper import get_stats
+    return jsonify({
+        'success': True,
+        'sweeper': get_stats()
+    })
+
 # Web form routes
 @app.route('/add_ban', methods=['POST'])
 @login_required
 def web_add_ban():
     """Web form endpoint to add a ban"""
-    from models import GameBan, Staff
     try:
         player_id = request.form.get('player_id')
         player_name = request.form.get('player_name', '')
@@ -385,12 +915,6 @@ def web_add_ban():
             flash('ID do jogador é obrigatório', 'error')
             return redirect(url_for('index'))
         
-        # Check if player is already banned
-        existing_ban = GameBan.query.filter_by(player_id=str(player_id), is_active=True).first()
-        if existing_ban and not existing_ban.is_expired():
-            flash(f'Jogador {player_id} já está banido', 'warning')
-            return redirect(url_for('index'))
-        
         # Calculate expiration for temporary bans
         expires_at = None
         if ban_type == 'temporary' and expires_in_hours:
@@ -400,35 +924,24 @@ def web_add_ban():
                 flash('Tempo de expiração inválido', 'error')
                 return redirect(url_for('index'))
         
-        # Get banned_by_id (handle both JSON admin and DB staff)
-        banned_by_id = None
-        if hasattr(current_user, 'id') and isinstance(current_user.id, int):
-            banned_by_id = current_user.id
-        else:
-            # For JSON admins, find or create a staff record
-            staff = Staff.query.filter_by(username=current_user.username).first()
-            if not staff:
-                staff = Staff(
-                    username=current_user.username,
-                    email=f"{current_user.username}@admin.local",
-                    is_admin=True
-                )
-                staff.set_password('temp_password')
-                db.session.add(staff)
-                db.session.commit()
-            banned_by_id = staff.id
-        
-        # Create new ban
-        new_ban = GameBan(
-            player_id=str(player_id),
-            player_name=player_name,
-            reason=reason,
-            ban_type=ban_type,
-            expires_at=expires_at,
-            banned_by_id=banned_by_id
-        )
-        
-        db.session.add(new_ban)
+        banned_by_id = _current_staff_id()
+        
+        # Create new ban; the unique index turns a concurrent duplicate into None
+        ban_id = ban_import.create_ban(db.session, {
+            'player_id': str(player_id),
+            'player_name': player_name,
+            'reason': reason,
+            'ban_type': ban_type,
+            'expires_at': expires_at,
+            'banned_by_id': banned_by_id
+        })
+        if ban_id is None:
+            db.session.rollback()
+            flash(f'Jogador {player_id} já está banido', 'warning')
+            return redirect(url_for('index'))
+        
+        ban_events.publish('created', ban_id, str(player_id))
+        ban_version.bump()
         db.session.commit()
         
         ban_msg = f'Jogador {player_id} foi banido'
@@ -451,8 +964,10 @@ def web_remove_ban(ban_id):
     try:
         ban = GameBan.query.get_or_404(ban_id)
         
-        ban.is_active = False
-        ban.updated_at = datetime.now()
+        if not _deactivate_ban(ban):
+            db.session.rollback()
+            flash(f'Ban do jogador {ban.player_id} já foi removido', 'warning')
+            return redirect(url_for('index'))
         db.session.commit()
         
         flash(f'Ban do jogador {ban.player_id} foi removido', 'success')
@@ -469,19 +984,29 @@ def web_remove_ban(ban_id):
 @login_required
 def admin_panel():
     """Admin panel for managing admins and staff"""
-    from admin_manager import list_admins, get_logs
+    from admin_manager import list_admins, get_logs_page
+    from audit_log import list_actions
     from models import Staff
     
     if not current_user.is_admin:
         flash('Acesso negado. Apenas administradores podem ver esta página.', 'error')
         return redirect(url_for('index'))
     
+    # Log filters and pagination
+    log_filters = {
+        'action': request.args.get('action') or None,
+        'author': request.args.get('author') or None,
+    }
+    before_id = request.args.get('before', type=int)
+    
     # Get JSON admins, DB staff and logs
     json_admins = list_admins()
     staff_members = Staff.query.order_by(Staff.created_at.desc()).all()
-    recent_logs = get_logs(20)  # Get last 20 logs
+    recent_logs, next_before = get_logs_page(20, before_id=before_id, **log_filters)
     
-    return render_template('admin_panel.html', json_admins=json_admins, staff_members=staff_members, recent_logs=recent_logs)
+    return render_template('admin_panel.html', json_admins=json_admins, staff_members=staff_members,
+                           recent_logs=recent_logs, next_before=next_before,
+                           log_filters=log_filters, log_actions=list_actions())
 
 @app.route('/add_json_admin', methods=['POST'])
 @login_required
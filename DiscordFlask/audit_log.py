@@ -0,0 +1,187 @@
+import os
+import json
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+# Admin actions are appended to the admin_logs table. Writers only enqueue;
+# a background thread inserts the queue in one multi-row INSERT every
+# AUDIT_FLUSH_INTERVAL seconds (or as soon as AUDIT_BATCH_SIZE entries wait).
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "200"))
+AUDIT_MAX_PENDING = int(os.environ.get("AUDIT_MAX_PENDING", "10000"))
+
+LEGACY_LOG_FILE = "admin_logs.json"
+
+
+class AuditLogWriter:
+    """Buffers audit entries and inserts them in batches"""
+
+    def __init__(self, flush_interval=AUDIT_FLUSH_INTERVAL, batch_size=AUDIT_BATCH_SIZE):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def record(self, action, target, author="System"):
+        """Queue one entry; it reaches the database on the next flush"""
+        entry = {
+            'timestamp': datetime.now(),
+            'action': _fit('action', action) or '',
+            'target': _fit('target', target),
+            'author': _fit('author', author),
+        }
+        with self._lock:
+            self._pending.append(entry)
+            pending = len(self._pending)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+                self._thread.start()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Insert everything queued so far; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+
+            from app import app
+            from extensions import db
+            from models import AdminLog
+            with app.app_context():
+                try:
+                    db.session.execute(insert(AdminLog), rows)
+                    db.session.commit()
+                    return len(rows)
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Error writing {len(rows)} audit log entries: {e}")
+
+                # One bad row must not hold back the rest: retry them one at a
+                # time, drop the rows the database rejects and requeue the rest
+                # only if the database itself is unavailable
+                written = 0
+                for i, row in enumerate(rows):
+                    try:
+                        db.session.execute(insert(AdminLog), [row])
+                        db.session.commit()
+                        written += 1
+                    except OperationalError as e:
+                        db.session.rollback()
+                        logging.error(f"Audit log database unavailable, requeueing {len(rows) - i} entries: {e}")
+                        self._requeue(rows[i:])
+                        break
+                    except Exception as e:
+                        db.session.rollback()
+                        logging.error(f"Dropping audit log entry {row!r}: {e}")
+                return written
+
+    def _requeue(self, rows):
+        with self._lock:
+            self._pending[:0] = rows
+            dropped = len(self._pending) - AUDIT_MAX_PENDING
+            if dropped > 0:
+                del self._pending[:dropped]
+                logging.error(f"Audit log queue full, dropped {dropped} oldest entries")
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+def _fit(column, value):
+    """value as a string no longer than the admin_logs column allows"""
+    from models import AdminLog
+    if value is None:
+        return None
+    value = str(value)
+    length = AdminLog.__table__.c[column].type.length
+    return value[:length] if length else value
+
+
+writer = AuditLogWriter()
+atexit.register(writer.flush)
+
+
+def record(action, target, author="System"):
+    """Append an entry to the audit log (buffered)"""
+    writer.record(action, target, author)
+
+
+def query_logs(limit=50, before_id=None, action=None, author=None, since=None, until=None):
+    """Newest-first page of audit entries matching the filters.
+
+    Returns (entries, next_before_id); pass next_before_id back as before_id
+    to get the following page. Pending entries are flushed first so a page
+    always includes the caller's own latest actions.
+    """
+    from models import AdminLog
+
+    writer.flush()
+
+    query = AdminLog.query
+    if before_id:
+        query = query.filter(AdminLog.id < before_id)
+    if action:
+        query = query.filter(AdminLog.action == action)
+    if author:
+        query = query.filter(AdminLog.author == author)
+    if since:
+        query = query.filter(AdminLog.timestamp >= since)
+    if until:
+        query = query.filter(AdminLog.timestamp < until)
+
+    logs = query.order_by(AdminLog.id.desc()).limit(limit + 1).all()
+    next_before_id = logs[limit - 1].id if len(logs) > limit else None
+    return [log.to_dict() for log in logs[:limit]], next_before_id
+
+
+def list_actions():
+    """Distinct action names, for filter drop-downs"""
+    from extensions import db
+    from models import AdminLog
+    return [row[0] for row in db.session.query(AdminLog.action).distinct().order_by(AdminLog.action)]
+
+
+def import_legacy_logs(path=LEGACY_LOG_FILE):
+    """One-time import of the old admin_logs.json into the audit table.
+
+    Must be called inside an application context. The file is renamed to
+    <path>.imported afterwards so it is never imported twice.
+    """
+    from extensions import db
+    from models import AdminLog
+
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r") as f:
+            entries = json.load(f)
+        rows = [{
+            'timestamp': datetime.fromisoformat(e['timestamp']),
+            'action': e.get('action', ''),
+            'target': e.get('target'),
+            'author': e.get('author'),
+        } for e in entries]
+        if rows:
+            db.session.execute(insert(AdminLog), rows)
+            db.session.commit()
+        os.replace(path, path + ".imported")
+        logging.info(f"Imported {len(rows)} legacy audit log entries from {path}")
+        return len(rows)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error importing legacy audit log {path}: {e}")
+        return 0
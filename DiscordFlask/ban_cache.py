@@ -0,0 +1,88 @@
+import os
+
+import ban_version
+from cache import ExpiringLRUCache
+
+# Both positive and negative lookups are cached. Entries are keyed by the
+# ban-set version, which every ban mutation bumps in whichever process makes
+# it, so a change anywhere makes the old entries unreachable once the version
+# is re-read (at most BAN_VERSION_TTL seconds later in other processes).
+# Positive entries also never outlive the ban's own expires_at; BAN_CACHE_TTL
+# only bounds how long an unused entry takes up room.
+BAN_CACHE_SIZE = int(os.environ.get("BAN_CACHE_SIZE", "50000"))
+BAN_CACHE_TTL = int(os.environ.get("BAN_CACHE_TTL", "300"))
+
+_NOT_BANNED = object()
+_cache = ExpiringLRUCache(maxsize=BAN_CACHE_SIZE, default_ttl=BAN_CACHE_TTL)
+
+
+def _ttl_for(info):
+    """Seconds an entry may stay cached: never past the ban's own expiry"""
+    if info is None:
+        return BAN_CACHE_TTL
+    remaining = info.time_remaining()
+    if remaining is None:
+        return BAN_CACHE_TTL
+    return min(BAN_CACHE_TTL, remaining.total_seconds())
+
+
+def _store(version, player_id, info):
+    value = info if info is not None else _NOT_BANNED
+    _cache.set((version, player_id), value, ttl=_ttl_for(info))
+
+
+def get_active_ban(player_id, version=None):
+    """Return the active BanRow for player_id, or None if not banned.
+
+    Must be called inside an application context; the database is only hit
+    on a cache miss. Pass the ban-set version when it also goes into an ETag,
+    so the tag and the answer belong to the same version.
+    """
+    player_id = str(player_id)
+    return get_active_bans([player_id], version)[player_id]
+
+
+def get_active_bans(player_ids, version=None):
+    """Return {player_id: BanRow or None} for many players at once.
+
+    Cached players are answered from memory; every miss is resolved together
+    with a single IN query joined with the staff username.
+    """
+    if version is None:
+        version = ban_version.current()
+    results = {}
+    missing = []
+    for player_id in player_ids:
+        player_id = str(player_id)
+        if player_id in results:
+            continue
+        cached = _cache.get((version, player_id))
+        if cached is _NOT_BANNED:
+            results[player_id] = None
+        elif cached is not None and not cached.is_expired():
+            results[player_id] = cached
+        else:
+            results[player_id] = None
+            missing.append(player_id)
+
+    if not missing:
+        return results
+
+    import ban_repository
+
+    for ban in ban_repository.get_active_bans_for_players(missing):
+        results[ban.player_id] = ban
+
+    for player_id in missing:
+        _store(version, player_id, results[player_id])
+    return results
+
+
+def clear():
+    """Forget every cached lookup"""
+    _cache.clear()
+
+
+def stats():
+    """Cache counters (hits, misses, size, evictions)"""
+    return _cache.stats()
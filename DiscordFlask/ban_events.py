@@ -0,0 +1,82 @@
+import json
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+# Ban change notifications (created / removed / expired) for live dashboards.
+# Mutation paths call publish() inside their transaction; nothing is delivered
+# unless the transaction commits.
+#
+# PostgreSQL: publish() issues pg_notify on CHANNEL, so listeners in any
+# process (see ban_stream.py) receive the event at commit.
+# Other databases: events are handed to in-process subscribers after commit,
+# which covers the single-process development setup of main.py.
+CHANNEL = 'ban_events'
+
+_subscribers = []
+_subscribers_lock = threading.Lock()
+
+
+def _uses_notify(session):
+    return session.get_bind().dialect.name == 'postgresql'
+
+
+def publish(event_type, ban_id, player_id, expires_at=None):
+    """Queue a ban event in the current transaction; the caller commits.
+
+    expires_at (removed/expired events) lets dashboards tell whether their
+    counters still counted the ban as in force.
+    """
+    from extensions import db
+
+    payload = json.dumps({
+        'event': event_type,
+        'id': ban_id,
+        'player_id': player_id,
+        'expires_at': expires_at.isoformat() if expires_at else None,
+        'at': datetime.now().isoformat(),
+    })
+    if _uses_notify(db.session):
+        db.session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                           {'channel': CHANNEL, 'payload': payload})
+    else:
+        db.session.info.setdefault('ban_events', []).append(payload)
+
+
+def subscribe(callback):
+    """Call callback(payload) for every committed event of this process.
+
+    Only used where pg_notify is unavailable. The callback runs on the
+    committing thread, so it must hand the payload off quickly.
+    """
+    with _subscribers_lock:
+        _subscribers.append(callback)
+
+
+def unsubscribe(callback):
+    with _subscribers_lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    payloads = session.info.pop('ban_events', None)
+    if not payloads:
+        return
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for payload in payloads:
+        for callback in subscribers:
+            try:
+                callback(payload)
+            except Exception as e:
+                logging.error(f"Error dispatching ban event: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('ban_events', None)
@@ -0,0 +1,347 @@
+import os
+import csv
+import io
+import json
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, text, update
+from werkzeug.security import generate_password_hash
+
+import ban_events
+import ban_search
+import ban_version
+
+# Ban creation: single bans (POST /api/bans, the web form) and bulk imports
+# (POST /api/bans/bulk) for mass-ban waves.
+#
+# The partial unique index uq_game_bans_player_active allows one active ban
+# per player, so bans are written with INSERT ... ON CONFLICT DO NOTHING: two
+# staff members banning the same player at once get one ban and one
+# "already banned", without a lookup first. An active ban that has lapsed but
+# was not swept yet still holds the index entry; it is deactivated and the
+# insert retried.
+#
+# Bulk imports accept CSV (header row required) or NDJSON (one JSON object
+# per line) with the fields of POST /api/bans: player_id, player_name,
+# reason, ban_type, expires_in_hours. Players that are already banned are
+# found with set-based IN (...) lookups, the rest are written with multi-row
+# INSERTs, and every input row gets a result.
+#
+# Each batch of BULK_INSERT_BATCH players is looked up, inserted and
+# committed in its own transaction, so a large import stays well inside
+# ban_version.BAN_WRITE_MAX_SECONDS. An import is therefore not atomic: if a
+# batch fails, the batches before it stay committed and the rest of the
+# rows are reported as failed.
+BULK_IMPORT_MAX_ROWS = int(os.environ.get("BULK_IMPORT_MAX_ROWS", "100000"))
+# Players per transaction (one multi-row INSERT) and player IDs per IN (...)
+# lookup; both stay well under the bound-parameter limits of SQLite and
+# PostgreSQL
+BULK_INSERT_BATCH = int(os.environ.get("BULK_INSERT_BATCH", "1000"))
+BULK_LOOKUP_CHUNK = 1000
+
+FORMATS = ('csv', 'ndjson')
+BAN_TYPES = ('permanent', 'temporary')
+FIELD_MAX_LENGTH = 100
+
+
+def detect_format(mimetype, filename=None):
+    """'csv', 'ndjson' or None from a content type or upload file name"""
+    mimetype = (mimetype or '').lower()
+    if mimetype in ('text/csv', 'application/csv'):
+        return 'csv'
+    if mimetype in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        return 'ndjson'
+    if filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        if extension == 'csv':
+            return 'csv'
+        if extension in ('ndjson', 'jsonl'):
+            return 'ndjson'
+    return None
+
+
+def _parse_csv(text):
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or 'player_id' not in [name.strip().lower() for name in reader.fieldnames]:
+        raise ValueError('CSV precisa de um cabeçalho com a coluna player_id')
+    for record in reader:
+        record = {(key or '').strip().lower(): value for key, value in record.items()}
+        yield reader.line_num, record
+
+
+def _parse_ndjson(text):
+    for line_number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, None
+            continue
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def parse(body, import_format):
+    """[(line number, record dict or None)] from an uploaded file.
+
+    Raises ValueError for an unreadable file or one over BULK_IMPORT_MAX_ROWS.
+    """
+    try:
+        text = body.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValueError('Arquivo precisa estar em UTF-8')
+    parser = _parse_csv if import_format == 'csv' else _parse_ndjson
+    records = []
+    for item in parser(text):
+        records.append(item)
+        if len(records) > BULK_IMPORT_MAX_ROWS:
+            raise ValueError(f'Máximo de {BULK_IMPORT_MAX_ROWS} linhas por importação')
+    return records
+
+
+def _text(record, key):
+    value = record.get(key)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _validate(record, now):
+    """(row values, None) or (None, error message) for one input record"""
+    if record is None:
+        return None, 'Linha inválida'
+    player_id = _text(record, 'player_id')
+    if not player_id:
+        return None, 'ID do jogador é obrigatório'
+    player_name = _text(record, 'player_name')
+    if len(player_id) > FIELD_MAX_LENGTH or len(player_name) > FIELD_MAX_LENGTH:
+        return None, f'ID e nome do jogador têm no máximo {FIELD_MAX_LENGTH} caracteres'
+    ban_type = _text(record, 'ban_type') or 'permanent'
+    if ban_type not in BAN_TYPES:
+        return None, 'Tipo de ban inválido'
+
+    expires_at = None
+    hours = _text(record, 'expires_in_hours')
+    if ban_type == 'temporary' and hours:
+        try:
+            expires_at = now + timedelta(hours=int(hours))
+        except (ValueError, TypeError, OverflowError):
+            return None, 'Tempo de expiração inválido'
+
+    return {
+        'player_id': player_id,
+        'player_name': player_name,
+        'reason': _text(record, 'reason') or 'Nenhum motivo fornecido',
+        'ban_type': ban_type,
+        'expires_at': expires_at,
+    }, None
+
+
+def _dialect_insert(session):
+    """The insert() construct with ON CONFLICT support, or None for other databases"""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def _insert_statement(session):
+    """INSERT into game_bans that skips players with an active ban"""
+    from models import GameBan
+    table = GameBan.__table__
+    dialect_insert = _dialect_insert(session)
+    if dialect_insert is None:
+        # No ON CONFLICT: a duplicate raises IntegrityError from the index
+        return insert(table).returning(table.c.id, table.c.player_id, table.c.player_name)
+    statement = dialect_insert(table).on_conflict_do_nothing(
+        index_elements=[table.c.player_id], index_where=text('is_active'))
+    return statement.returning(table.c.id, table.c.player_id, table.c.player_name)
+
+
+def staff_id_for(session, username):
+    """Id of the staff row of a JSON-file admin, created in the session's transaction.
+
+    The row is inserted with ON CONFLICT (username) DO NOTHING, so two first
+    bans of one admin at once share a row instead of failing on the unique
+    username. The caller commits it together with the ban.
+    """
+    from models import Staff
+    table = Staff.__table__
+    values = {
+        'username': username,
+        'email': f"{username}@admin.local",
+        'password_hash': generate_password_hash('temp_password'),
+        'is_admin': True,
+    }
+    dialect_insert = _dialect_insert(session)
+    if dialect_insert is not None:
+        session.execute(dialect_insert(table).values(**values)
+                        .on_conflict_do_nothing(index_elements=[table.c.username]))
+        return session.execute(select(table.c.id).where(table.c.username == username)).scalar_one()
+    staff_id = session.execute(select(table.c.id).where(table.c.username == username)).scalar()
+    if staff_id is None:
+        staff_id = session.execute(insert(table).values(**values).returning(table.c.id)).scalar_one()
+    return staff_id
+
+
+def _deactivate_lapsed(session, player_ids):
+    """Deactivate active bans of player_ids whose time is up; returns their player ids"""
+    from models import GameBan
+    now = datetime.now()
+    lapsed = session.execute(
+        update(GameBan.__table__)
+        .where(GameBan.player_id.in_(player_ids),
+               GameBan.is_active == True,
+               GameBan.ban_type == 'temporary',
+               GameBan.expires_at < now)
+        .values(is_active=False, updated_at=now)
+        .returning(GameBan.id, GameBan.player_id, GameBan.expires_at)
+    ).all()
+    for ban_id, player_id, expires_at in lapsed:
+        ban_events.publish('expired', ban_id, player_id, expires_at)
+    return {player_id for _, player_id, _ in lapsed}
+
+
+def create_ban(session, values):
+    """Insert one active ban in the session's transaction.
+
+    values holds the GameBan columns (player_id, player_name, reason,
+    ban_type, expires_at, banned_by_id). Returns the new ban id, or None if
+    the player is already banned. The caller commits.
+    """
+    now = datetime.now()
+    values = dict(values, is_active=True, created_at=now, updated_at=now)
+    statement = _insert_statement(session).values(**values)
+    inserted = session.execute(statement).first()
+    if inserted is None:
+        if not _deactivate_lapsed(session, [values['player_id']]):
+            return None
+        inserted = session.execute(statement).first()
+        if inserted is None:
+            return None
+    # Core statements skip the mapper events that maintain the search index
+    ban_search.index_bans(session.connection(), [inserted])
+    return inserted[0]
+
+
+def _already_banned(session, player_ids):
+    """(subset of player_ids that currently have an active ban, players whose
+    lapsed active ban was deactivated so the insert can replace it)"""
+    from models import GameBan
+    banned = set()
+    lapsed = []
+    for start in range(0, len(player_ids), BULK_LOOKUP_CHUNK):
+        chunk = player_ids[start:start + BULK_LOOKUP_CHUNK]
+        rows = session.execute(
+            select(GameBan.player_id, GameBan.currently_banned)
+            .where(GameBan.player_id.in_(chunk), GameBan.is_active == True)
+        )
+        for player_id, current in rows:
+            if current:
+                banned.add(player_id)
+            else:
+                lapsed.append(player_id)
+    deactivated = set()
+    for start in range(0, len(lapsed), BULK_LOOKUP_CHUNK):
+        deactivated |= _deactivate_lapsed(session, lapsed[start:start + BULK_LOOKUP_CHUNK])
+    return banned, deactivated
+
+
+def _import_batch(session, batch, banned_by_id, now):
+    """Insert one batch of (values, result) pairs; returns the (ban id, player id) created.
+
+    Sets the status of every result in the batch. The caller commits.
+    """
+    banned, deactivated = _already_banned(session, [values['player_id'] for values, _ in batch])
+    rows = []
+    results = {}
+    for values, result in batch:
+        if values['player_id'] in banned:
+            result['status'] = 'already_banned'
+            continue
+        values.update(is_active=True, created_at=now, updated_at=now, banned_by_id=banned_by_id)
+        rows.append(values)
+        results[values['player_id']] = result
+
+    created = []
+    if rows:
+        # Core INSERT ... RETURNING skips the mapper events, so the search
+        # index is filled here in the same transaction
+        connection = session.connection()
+        inserted = connection.execute(_insert_statement(session), rows).all()
+        ban_search.index_bans(connection, inserted)
+        for ban_id, player_id, _ in inserted:
+            results[player_id].update(status='created', ban_id=ban_id)
+            created.append((ban_id, player_id))
+    # Rows skipped by ON CONFLICT were banned by someone else in the meantime
+    for result in results.values():
+        result.setdefault('status', 'already_banned')
+    if created or deactivated:
+        ban_version.bump()
+    return created
+
+
+def import_bans(session, records, banned_by_id, event_limit):
+    """Insert bans for parsed records, committing one batch at a time.
+
+    Returns (results, created): one result dict per record, in input order,
+    with status created / already_banned / duplicate / invalid / failed, and
+    the (ban id, player id) pairs committed. Imports of up to event_limit
+    players publish one 'created' event per ban, larger ones a single
+    'resync' once their batches are committed.
+    """
+    now = datetime.now()
+    results = []
+    pending = {}
+    for line_number, record in records:
+        values, error = _validate(record, now)
+        if error:
+            player_id = _text(record, 'player_id') if isinstance(record, dict) else None
+            results.append({'line': line_number, 'player_id': player_id or None,
+                            'status': 'invalid', 'error': error})
+            continue
+        result = {'line': line_number, 'player_id': values['player_id']}
+        if values['player_id'] in pending:
+            result['status'] = 'duplicate'
+        else:
+            pending[values['player_id']] = (values, result)
+        results.append(result)
+
+    batches = list(pending.values())
+    announce_each = len(batches) <= event_limit
+    created = []
+    for start in range(0, len(batches), BULK_INSERT_BATCH):
+        batch = batches[start:start + BULK_INSERT_BATCH]
+        try:
+            inserted = _import_batch(session, batch, banned_by_id, now)
+            if announce_each:
+                for ban_id, player_id in inserted:
+                    ban_events.publish('created', ban_id, player_id)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logging.error(f"Error importing ban batch at player {start}: {e}")
+            for values, result in batches[start:]:
+                result.pop('ban_id', None)
+                result.update(status='failed', error=str(e))
+            break
+        created.extend(inserted)
+
+    if created and not announce_each:
+        ban_events.publish('resync', None, None)
+        session.commit()
+    return results, created
+
+
+def summarize(results):
+    """Count of results per status"""
+    summary = {'received': len(results), 'created': 0, 'already_banned': 0,
+               'duplicate': 0, 'invalid': 0, 'failed': 0}
+    for result in results:
+        summary[result['status']] += 1
+    return summary
@@ -0,0 +1,253 @@
+# Read-side queries over game bans, shared by the web app and the bot.
+# Queries project only the columns they need joined with the staff username and
+# return BanRow tuples instead of ORM instances, so listing N bans is one round
+# trip instead of N + 1 lazy loads of staff_member.
+import base64
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import case, func, tuple_
+
+
+class BanRow(namedtuple('BanRow', [
+        'id', 'player_id', 'player_name', 'reason', 'ban_type', 'expires_at',
+        'is_active', 'created_at', 'updated_at', 'banned_by'])):
+    """Read-only view of a GameBan plus the username of the staff who made it"""
+    __slots__ = ()
+
+    def is_expired(self):
+        """Check if temporary ban has expired"""
+        if self.ban_type == 'temporary' and self.expires_at:
+            return datetime.now() > self.expires_at
+        return False
+
+    def time_remaining(self):
+        """Get remaining time for temporary bans"""
+        if self.ban_type == 'temporary' and self.expires_at and not self.is_expired():
+            return self.expires_at - datetime.now()
+        return None
+
+    def to_dict(self):
+        """Serialize the way the JSON API lists bans"""
+        data = {
+            'id': self.id,
+            'player_id': self.player_id,
+            'player_name': self.player_name,
+            'reason': self.reason,
+            'ban_type': self.ban_type,
+            'is_expired': self.is_expired(),
+            'created_at': self.created_at.isoformat(),
+            'banned_by': self.banned_by
+        }
+        if self.ban_type == 'temporary' and self.expires_at:
+            data['expires_at'] = self.expires_at.isoformat()
+            remaining = self.time_remaining()
+            if remaining:
+                data['time_remaining'] = str(remaining)
+        return data
+
+
+def ban_rows_query():
+    """Projection of GameBan columns joined with the staff username"""
+    from extensions import db
+    from models import GameBan, Staff
+    return (db.session.query(
+                GameBan.id, GameBan.player_id, GameBan.player_name, GameBan.reason,
+                GameBan.ban_type, GameBan.expires_at, GameBan.is_active,
+                GameBan.created_at, GameBan.updated_at,
+                Staff.username.label('banned_by'))
+            .join(Staff, GameBan.banned_by_id == Staff.id))
+
+
+def _to_rows(query):
+    return [BanRow(*row) for row in query]
+
+
+def _encode_key(timestamp, ban_id):
+    raw = f"{timestamp.isoformat()}|{ban_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_key(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, ban_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(ban_id)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+
+def encode_cursor(row):
+    """Opaque cursor pointing at the last row of a page"""
+    return _encode_key(row.created_at, row.id)
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on malformed cursors"""
+    return _decode_key(cursor)
+
+
+def encode_change_cursor(row):
+    """Opaque change-feed cursor pointing at the last change returned"""
+    return _encode_key(row.updated_at, row.id)
+
+
+def decode_change_cursor(cursor):
+    """Inverse of encode_change_cursor; raises ValueError on malformed cursors"""
+    return _decode_key(cursor)
+
+
+def _filtered(query, filters):
+    """Apply listing filters and keyset ordering on (created_at, id)"""
+    from models import GameBan, Staff
+    query = query.filter(GameBan.is_active == True)
+
+    if filters.get('ban_type'):
+        query = query.filter(GameBan.ban_type == filters['ban_type'])
+    if filters.get('expired') is not None:
+        query = query.filter(GameBan.expired if filters['expired'] else GameBan.currently_banned)
+    if filters.get('banned_by'):
+        query = query.filter(Staff.username == filters['banned_by'])
+    if filters.get('created_after'):
+        query = query.filter(GameBan.created_at >= filters['created_after'])
+    if filters.get('created_before'):
+        query = query.filter(GameBan.created_at < filters['created_before'])
+
+    key = tuple_(GameBan.created_at, GameBan.id)
+    cursor = filters.get('cursor')
+    if filters.get('order', 'desc') == 'desc':
+        if cursor:
+            query = query.filter(key < cursor)
+        return query.order_by(GameBan.created_at.desc(), GameBan.id.desc())
+    if cursor:
+        query = query.filter(key > cursor)
+    return query.order_by(GameBan.created_at.asc(), GameBan.id.asc())
+
+
+def list_bans_page(filters):
+    """Return (rows, next_cursor) for one keyset page of active bans"""
+    limit = filters['limit']
+    # Fetch one extra row to know whether another page exists
+    rows = _to_rows(_filtered(ban_rows_query(), filters).limit(limit + 1))
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def iter_bans(filters, chunk_size=1000):
+    """Yield every BanRow matching filters (no page limit).
+
+    Rows are streamed from a server-side cursor chunk_size at a time, so
+    memory stays flat however many bans match. Keep the application context
+    alive while iterating.
+    """
+    query = _filtered(ban_rows_query(), filters).yield_per(chunk_size)
+    for row in query:
+        yield BanRow(*row)
+
+
+def get_ban(ban_id):
+    """BanRow for one ban id, or None"""
+    from models import GameBan
+    row = ban_rows_query().filter(GameBan.id == ban_id).first()
+    return BanRow(*row) if row else None
+
+
+def list_current_bans(limit, offset=0):
+    """One page of bans that are active and not expired, newest first"""
+    from models import GameBan
+    return _to_rows(ban_rows_query()
+                    .filter(GameBan.currently_banned)
+                    .order_by(GameBan.created_at.desc(), GameBan.id.desc())
+                    .limit(limit).offset(offset))
+
+
+def ban_counts():
+    """Aggregate counters over is_active bans, computed in SQL.
+
+    total counts every is_active row (expired or not), active only those
+    still in force, and permanent/temporary split the active ones by type.
+    next_expiry is when the next of those temporary bans lapses (or None),
+    i.e. how long the counts stay right without a write.
+    """
+    from extensions import db
+    from models import GameBan
+    current = GameBan.currently_banned
+    temporary = current & (GameBan.ban_type == 'temporary')
+    row = (db.session.query(
+               func.count(GameBan.id),
+               func.coalesce(func.sum(case((current, 1), else_=0)), 0),
+               func.coalesce(func.sum(case((current & (GameBan.ban_type == 'permanent'), 1), else_=0)), 0),
+               func.coalesce(func.sum(case((temporary, 1), else_=0)), 0),
+               func.min(case((temporary, GameBan.expires_at))))
+           .filter(GameBan.is_active == True)
+           .one())
+    return {
+        'total': row[0],
+        'active': row[1],
+        'permanent': row[2],
+        'temporary': row[3],
+        'next_expiry': row[4],
+    }
+
+
+def top_staff(limit=1):
+    """[(username, ban count)] of the staff with the most bans in force"""
+    from extensions import db
+    from models import GameBan, Staff
+    count = func.count(GameBan.id)
+    return [tuple(row) for row in (db.session.query(Staff.username, count)
+            .join(GameBan, GameBan.banned_by_id == Staff.id)
+            .filter(GameBan.currently_banned)
+            .group_by(Staff.username)
+            .order_by(count.desc(), Staff.username)
+            .limit(limit))]
+
+
+def next_expiry():
+    """Earliest expires_at among temporary bans in force, or None"""
+    from extensions import db
+    from models import GameBan
+    return (db.session.query(func.min(GameBan.expires_at))
+            .filter(GameBan.currently_banned, GameBan.ban_type == 'temporary')
+            .scalar())
+
+
+def get_active_bans_for_players(player_ids):
+    """Bans currently in force for the given players, in one IN query"""
+    from models import GameBan
+    return _to_rows(ban_rows_query().filter(
+        GameBan.player_id.in_(player_ids), GameBan.currently_banned))
+
+
+def iter_current_ban_states(chunk_size=5000):
+    """Yield (id, player_id, ban_type, expires_at) of every ban in force"""
+    from extensions import db
+    from models import GameBan
+    query = (db.session.query(GameBan.id, GameBan.player_id, GameBan.ban_type, GameBan.expires_at)
+             .filter(GameBan.currently_banned)
+             .yield_per(chunk_size))
+    for row in query:
+        yield tuple(row)
+
+
+def ban_states_changed_since(since):
+    """[(id, player_id, ban_type, expires_at, is_active, updated_at)] of bans
+    updated at or after since, oldest first (range scan on updated_at, id)"""
+    from extensions import db
+    from models import GameBan
+    return [tuple(row) for row in (db.session.query(
+                GameBan.id, GameBan.player_id, GameBan.ban_type, GameBan.expires_at,
+                GameBan.is_active, GameBan.updated_at)
+            .filter(GameBan.updated_at >= since)
+            .order_by(GameBan.updated_at, GameBan.id))]
+
+
+def list_changes(after, limit, until):
+    """Bans whose updated_at is before until, after the (updated_at, id) key
+    after (None = from the start), oldest first: (rows, has_more)"""
+    from models import GameBan
+    query = ban_rows_query().filter(GameBan.updated_at < until)
+    if after:
+        query = query.filter(tuple_(GameBan.updated_at, GameBan.id) > after)
+    rows = _to_rows(query.order_by(GameBan.updated_at, GameBan.id).limit(limit + 1))
+    return rows[:limit], len(rows) > limit
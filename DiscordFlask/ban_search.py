@@ -0,0 +1,249 @@
+import logging
+
+from sqlalchemy import case, delete, func, insert, inspect, or_, select, text
+
+# Fuzzy player search over active bans, used by GET /api/bans/search and !search.
+#
+# PostgreSQL: pg_trgm GIN indexes on lower(player_id) / lower(player_name)
+# serve both substring (LIKE) and similarity (%) matches.
+# Other databases (SQLite in tests): a ban_search_ngrams side table maps every
+# trigram of the lowercased ID and name to its ban, kept in sync by mapper
+# events. Candidates are found by trigram lookups on its primary key and then
+# ranked in Python with the same tiers as the PostgreSQL query.
+NGRAM_SIZE = 3
+SEARCH_MAX_LIMIT = 50
+# Fuzzy-only matches (no substring hit) below this similarity are dropped
+FUZZY_MIN_SIMILARITY = 0.2
+
+_TRGM_INDEXES = (
+    ('ix_game_bans_player_id_trgm', 'lower(player_id)'),
+    ('ix_game_bans_player_name_trgm', 'lower(player_name)'),
+)
+
+
+def ngrams(value):
+    """Trigrams of a lowercased string (the whole string if shorter)"""
+    value = (value or '').lower()
+    if not value:
+        return set()
+    if len(value) < NGRAM_SIZE:
+        return {value}
+    return {value[i:i + NGRAM_SIZE] for i in range(len(value) - NGRAM_SIZE + 1)}
+
+
+def _index_grams(value):
+    """Trigrams stored for a value, padded so that every 1-2 character
+    substring is also the prefix of some stored trigram"""
+    if not value:
+        return set()
+    return ngrams(value + ' ' * (NGRAM_SIZE - 1))
+
+
+def _ngram_rows(ban_id, player_id, player_name):
+    grams = _index_grams(player_id) | _index_grams(player_name)
+    return [{'gram': gram, 'ban_id': ban_id} for gram in grams]
+
+
+def _uses_trigram_index(dialect_name):
+    return dialect_name == 'postgresql'
+
+
+def index_bans(connection, bans):
+    """Add n-gram rows for (ban id, player id, player name) tuples.
+
+    No-op on PostgreSQL. Callers that insert bans with Core statements (which
+    skip the mapper events) must call this in the same transaction.
+    """
+    if _uses_trigram_index(connection.dialect.name):
+        return
+    from models import BanSearchNgram
+    rows = []
+    for ban_id, player_id, player_name in bans:
+        rows.extend(_ngram_rows(ban_id, player_id, player_name))
+    if rows:
+        connection.execute(insert(BanSearchNgram), rows)
+
+
+def _after_insert(mapper, connection, target):
+    index_bans(connection, [(target.id, target.player_id, target.player_name)])
+
+
+def _after_update(mapper, connection, target):
+    if _uses_trigram_index(connection.dialect.name):
+        return
+    state = inspect(target)
+    if not (state.attrs.player_id.history.has_changes() or
+            state.attrs.player_name.history.has_changes()):
+        return
+    from models import BanSearchNgram
+    connection.execute(delete(BanSearchNgram).where(BanSearchNgram.ban_id == target.id))
+    index_bans(connection, [(target.id, target.player_id, target.player_name)])
+
+
+def _after_delete(mapper, connection, target):
+    if _uses_trigram_index(connection.dialect.name):
+        return
+    from models import BanSearchNgram
+    connection.execute(delete(BanSearchNgram).where(BanSearchNgram.ban_id == target.id))
+
+
+def register_index_listeners(GameBan):
+    """Keep the n-gram table in sync with ORM inserts/updates/deletes"""
+    from sqlalchemy import event
+    event.listen(GameBan, 'after_insert', _after_insert)
+    event.listen(GameBan, 'after_update', _after_update)
+    event.listen(GameBan, 'after_delete', _after_delete)
+
+
+def ensure_search_index(batch_size=5000):
+    """Create the search index for the current database.
+
+    PostgreSQL: enables pg_trgm and builds the GIN indexes concurrently.
+    Elsewhere: backfills the n-gram table if it is empty but bans exist.
+    Must be called inside an application context.
+    """
+    from extensions import db
+    from models import BanSearchNgram, GameBan
+
+    engine = db.engine
+    if _uses_trigram_index(engine.dialect.name):
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for name, expression in _TRGM_INDEXES:
+                conn.execute(text(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                    f"ON game_bans USING gin ({expression} gin_trgm_ops)"))
+        return
+
+    if db.session.query(BanSearchNgram.ban_id).first() is not None:
+        return
+
+    last_id = 0
+    indexed = 0
+    while True:
+        batch = (db.session.query(GameBan.id, GameBan.player_id, GameBan.player_name)
+                 .filter(GameBan.id > last_id)
+                 .order_by(GameBan.id)
+                 .limit(batch_size)
+                 .all())
+        if not batch:
+            break
+        index_bans(db.session.connection(), batch)
+        db.session.commit()
+        last_id = batch[-1][0]
+        indexed += len(batch)
+    if indexed:
+        logging.info(f"Built search n-gram index for {indexed} bans")
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _match_tier(term, *values):
+    """3 = exact, 2 = prefix, 1 = substring, 0 = fuzzy only"""
+    tier = 0
+    for value in values:
+        value = (value or '').lower()
+        if value == term:
+            return 3
+        if value.startswith(term):
+            tier = max(tier, 2)
+        elif term in value:
+            tier = max(tier, 1)
+    return tier
+
+
+def _similarity(term_grams, value):
+    grams = ngrams(value)
+    if not term_grams or not grams:
+        return 0.0
+    return len(term_grams & grams) / len(term_grams | grams)
+
+
+def _search_trigram(term, limit):
+    from models import GameBan
+    import ban_repository
+
+    pid = func.lower(GameBan.player_id)
+    pname = func.lower(GameBan.player_name)
+    contains = f'%{_escape_like(term)}%'
+    prefix = f'{_escape_like(term)}%'
+
+    tier = case(
+        (or_(pid == term, pname == term), 3),
+        (or_(pid.like(prefix, escape='\\'), pname.like(prefix, escape='\\')), 2),
+        (or_(pid.like(contains, escape='\\'), pname.like(contains, escape='\\')), 1),
+        else_=0)
+    similarity = func.greatest(func.similarity(pid, term), func.similarity(pname, term))
+
+    query = (ban_repository.ban_rows_query()
+             .add_columns(tier.label('tier'), similarity.label('score'))
+             .filter(GameBan.is_active == True,
+                     or_(pid.like(contains, escape='\\'),
+                         pname.like(contains, escape='\\'),
+                         pid.op('%')(term),
+                         pname.op('%')(term)))
+             .order_by(text('tier DESC'), text('score DESC'), GameBan.created_at.desc())
+             .limit(limit))
+    return [(ban_repository.BanRow(*row[:-2]), row[-2] + float(row[-1] or 0)) for row in query]
+
+
+def _search_ngrams(term, limit):
+    from models import BanSearchNgram, GameBan
+    import ban_repository
+
+    term_grams = ngrams(term)
+    matched = func.count(BanSearchNgram.gram).label('matched')
+    candidates = (select(BanSearchNgram.ban_id, matched)
+                  .join(GameBan, GameBan.id == BanSearchNgram.ban_id)
+                  .where(GameBan.is_active == True))
+    if len(term) < NGRAM_SIZE:
+        # Any trigram starting with the term contains it: a range scan on the key
+        candidates = candidates.where(BanSearchNgram.gram >= term,
+                                      BanSearchNgram.gram < term + '\U0010ffff')
+        needed = 1
+    else:
+        candidates = candidates.where(BanSearchNgram.gram.in_(term_grams))
+        # Require at least half of the trigrams so typos still match
+        needed = max(1, (len(term_grams) + 1) // 2)
+    candidates = (candidates.group_by(BanSearchNgram.ban_id)
+                  .having(matched >= needed)
+                  .order_by(matched.desc())
+                  .limit(limit * 10)
+                  .subquery())
+
+    rows = [ban_repository.BanRow(*row) for row in ban_repository.ban_rows_query()
+            .join(candidates, candidates.c.ban_id == GameBan.id)]
+
+    scored = []
+    for row in rows:
+        tier = _match_tier(term, row.player_id, row.player_name)
+        score = max(_similarity(term_grams, row.player_id), _similarity(term_grams, row.player_name))
+        if tier == 0 and score < FUZZY_MIN_SIMILARITY:
+            continue
+        scored.append((row, tier + score))
+    scored.sort(key=lambda item: (item[1], item[0].created_at), reverse=True)
+    return scored[:limit]
+
+
+def search(term, limit=10):
+    """Ranked [(BanRow, score)] of active bans matching term by ID or name.
+
+    Case-insensitive; exact matches rank first, then prefix, then substring,
+    then fuzzy (trigram similarity). Must be called inside an app context.
+    """
+    from extensions import db
+
+    term = (term or '').strip().lower()
+    if not term:
+        return []
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    if _uses_trigram_index(db.engine.dialect.name):
+        return _search_trigram(term, limit)
+    return _search_ngrams(term, limit)
+
+
+def search_bans(term, limit=5):
+    """Like search() but returns only the BanRows"""
+    return [row for row, _ in search(term, limit)]
@@ -0,0 +1,174 @@
+import os
+import gzip
+import math
+import struct
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import ban_repository
+import ban_version
+
+# Downloadable snapshot of every banned player ID, for game servers that
+# enforce bans locally at connect time instead of calling the check API.
+#
+# Snapshot (GET /api/bans/snapshot), gzip-compressed, big-endian:
+#   magic  b'BANSNAP1'
+#   u64    ban-set version
+#   u64    generated at (unix seconds)
+#   u32    entry count
+#   entry* sorted by player ID bytes:
+#          u16 length, UTF-8 player ID, u64 expires at (unix seconds, 0 = permanent)
+# Temporary entries stay in the file until the sweeper removes them, so
+# readers must treat an entry whose expiry has passed as not banned.
+#
+# Bloom filter (GET /api/bans/snapshot/bloom), gzip-compressed, big-endian:
+#   magic  b'BANBLOOM'
+#   u64    ban-set version
+#   u64    m (number of bits)
+#   u8     k (number of hash functions)
+#   bytes  bit array, bit i is (byte i // 8) & (1 << (i % 8))
+# Probe with d = blake2b(player_id_utf8, digest_size=16), h1 = d[:8], h2 = d[8:]
+# as big-endian integers; bit i of probe j is (h1 + j * h2) % m. Any clear
+# bit means "definitely not banned"; otherwise consult the snapshot or API.
+#
+# Both files are built at most once per ban-set version. After the first full
+# load, later versions only re-read rows whose updated_at moved.
+SNAPSHOT_MAGIC = b'BANSNAP1'
+BLOOM_MAGIC = b'BANBLOOM'
+BLOOM_FP_RATE = float(os.environ.get("BAN_BLOOM_FP_RATE", "0.01"))
+# Rows changed this many seconds before the last seen updated_at are re-read,
+# covering transactions that committed after a newer row was already seen
+# (ban writes last at most ban_version.BAN_WRITE_MAX_SECONDS)
+SNAPSHOT_SKEW = int(os.environ.get("BAN_SNAPSHOT_SKEW", "60"))
+
+
+def encode_snapshot(entries, version, generated_at):
+    """Serialize {player_id: expires_at_seconds} to the snapshot format"""
+    parts = [SNAPSHOT_MAGIC, struct.pack('>QQI', version, int(generated_at), len(entries))]
+    for key in sorted(player_id.encode('utf-8') for player_id in entries):
+        parts.append(struct.pack('>H', len(key)))
+        parts.append(key)
+        parts.append(struct.pack('>Q', entries[key.decode('utf-8')]))
+    return gzip.compress(b''.join(parts), compresslevel=6, mtime=0)
+
+
+def decode_snapshot(data):
+    """Inverse of encode_snapshot: (version, generated_at, {player_id: expires_at})"""
+    raw = gzip.decompress(data)
+    if raw[:8] != SNAPSHOT_MAGIC:
+        raise ValueError('Snapshot inválido')
+    version, generated_at, count = struct.unpack_from('>QQI', raw, 8)
+    offset = 28
+    entries = {}
+    for _ in range(count):
+        (length,) = struct.unpack_from('>H', raw, offset)
+        offset += 2
+        player_id = raw[offset:offset + length].decode('utf-8')
+        offset += length
+        (entries[player_id],) = struct.unpack_from('>Q', raw, offset)
+        offset += 8
+    return version, generated_at, entries
+
+
+def _bloom_probes(player_id, m, k):
+    digest = hashlib.blake2b(player_id.encode('utf-8'), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:], 'big')
+    return [(h1 + j * h2) % m for j in range(k)]
+
+
+def encode_bloom(player_ids, version, fp_rate=BLOOM_FP_RATE):
+    """Bloom filter of player_ids sized for fp_rate false positives"""
+    n = max(1, len(player_ids))
+    m = max(8, int(math.ceil(-n * math.log(fp_rate) / (math.log(2) ** 2))))
+    k = max(1, min(255, int(round(m / n * math.log(2)))))
+    bits = bytearray((m + 7) // 8)
+    for player_id in player_ids:
+        for i in _bloom_probes(player_id, m, k):
+            bits[i // 8] |= 1 << (i % 8)
+    header = BLOOM_MAGIC + struct.pack('>QQB', version, m, k)
+    return gzip.compress(header + bytes(bits), compresslevel=6, mtime=0)
+
+
+def bloom_might_contain(data, player_id):
+    """Check a player against an encoded Bloom filter (False = not banned)"""
+    raw = gzip.decompress(data)
+    if raw[:8] != BLOOM_MAGIC:
+        raise ValueError('Filtro Bloom inválido')
+    _, m, k = struct.unpack_from('>QQB', raw, 8)
+    bits = raw[25:]
+    return all(bits[i // 8] & (1 << (i % 8)) for i in _bloom_probes(player_id, m, k))
+
+
+def _expiry_seconds(ban_type, expires_at):
+    if ban_type == 'temporary' and expires_at:
+        return int(expires_at.timestamp())
+    return 0
+
+
+class SnapshotBuilder:
+    """Keeps the banned-ID set in memory and the encoded files per version"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # player_id -> (ban id, expires at seconds)
+        self._entries = None
+        self._watermark = None
+        self._version = None
+        self._files = {}
+        self.stats = {'full_builds': 0, 'incremental_builds': 0, 'served_cached': 0}
+
+    def _full_load(self):
+        entries = {}
+        for ban_id, player_id, ban_type, expires_at in ban_repository.iter_current_ban_states():
+            entries[player_id] = (ban_id, _expiry_seconds(ban_type, expires_at))
+        self._entries = entries
+        self.stats['full_builds'] += 1
+
+    def _apply_changes(self):
+        """Re-read rows updated since the watermark; returns the new watermark"""
+        changes = ban_repository.ban_states_changed_since(self._watermark - timedelta(seconds=SNAPSHOT_SKEW))
+        now = datetime.now()
+        for ban_id, player_id, ban_type, expires_at, is_active, updated_at in changes:
+            lapsed = ban_type == 'temporary' and expires_at is not None and expires_at < now
+            if is_active and not lapsed:
+                self._entries[player_id] = (ban_id, _expiry_seconds(ban_type, expires_at))
+            elif self._entries.get(player_id, (None,))[0] == ban_id:
+                del self._entries[player_id]
+        self.stats['incremental_builds'] += 1
+        if changes:
+            return max(self._watermark, changes[-1][5])
+        return self._watermark
+
+    def get(self, kind):
+        """(version, encoded bytes) of 'snapshot' or 'bloom' for the current
+        ban-set version, building it if needed. Needs an app context."""
+        version = ban_version.current()
+        with self._lock:
+            if self._version == version and kind in self._files:
+                self.stats['served_cached'] += 1
+                return version, self._files[kind]
+
+            if self._version != version:
+                started = datetime.now()
+                if self._entries is None:
+                    self._full_load()
+                    self._watermark = started
+                else:
+                    self._watermark = self._apply_changes()
+                self._version = version
+                self._files = {}
+                logging.info(f"Ban snapshot at version {version}: {len(self._entries)} entries")
+
+            if kind == 'bloom':
+                data = encode_bloom(list(self._entries), version)
+            else:
+                entries = {player_id: expires for player_id, (_, expires) in self._entries.items()}
+                data = encode_snapshot(entries, version, datetime.now().timestamp())
+            self._files[kind] = data
+            return version, data
+
+
+builder = SnapshotBuilder()
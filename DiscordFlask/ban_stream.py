@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import select
+import asyncio
+import logging
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+import ban_events
+
+# Server-Sent Events feed of ban changes (GET /api/bans/stream).
+#
+# Runs on its own asyncio server instead of the WSGI app: an idle dashboard
+# connection costs one small coroutine here, not a blocked worker thread.
+# In development main.py starts it on BAN_STREAM_PORT next to Flask; in
+# production a reverse proxy routes /api/bans/stream to it (BAN_STREAM_URL
+# tells the dashboard where to connect).
+BAN_STREAM_HOST = os.environ.get("BAN_STREAM_HOST", "0.0.0.0")
+BAN_STREAM_PORT = int(os.environ.get("BAN_STREAM_PORT", "5001"))
+# Seconds between keep-alive comments on idle connections
+BAN_STREAM_HEARTBEAT = float(os.environ.get("BAN_STREAM_HEARTBEAT", "15"))
+# Events kept for Last-Event-ID replay after a reconnect
+BAN_STREAM_REPLAY = int(os.environ.get("BAN_STREAM_REPLAY", "1000"))
+# Events buffered per slow client before it is told to resync
+BAN_STREAM_CLIENT_QUEUE = int(os.environ.get("BAN_STREAM_CLIENT_QUEUE", "256"))
+
+_RESYNC = {'event': 'resync'}
+
+FLASK_APP_KEY = web.AppKey('flask_app', object)
+HUB_KEY = web.AppKey('hub', object)
+
+
+class BanStreamHub:
+    """Fans events out to every connected client. Lives on the server's loop"""
+
+    def __init__(self, replay_size=BAN_STREAM_REPLAY):
+        self.clients = set()
+        self.seq = 0
+        self.recent = deque(maxlen=replay_size)
+
+    def broadcast(self, payload):
+        self.seq += 1
+        self.recent.append((self.seq, payload))
+        for queue in list(self.clients):
+            self._offer(queue, (self.seq, payload))
+
+    def resync(self):
+        """Tell every client it may have missed events (e.g. listener reconnect)"""
+        self.recent.clear()
+        for queue in list(self.clients):
+            self._offer(queue, None)
+
+    def _offer(self, queue, item):
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Drop the backlog; the client reloads its table instead
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def replay_since(self, last_id):
+        """Events after last_id, or None if they are no longer buffered"""
+        if last_id == self.seq:
+            return []
+        if last_id > self.seq:
+            # Issued by an earlier run of this server
+            return None
+        if not self.recent or self.recent[0][0] > last_id + 1:
+            return None
+        return [item for item in self.recent if item[0] > last_id]
+
+    def connect(self):
+        queue = asyncio.Queue(maxsize=BAN_STREAM_CLIENT_QUEUE)
+        self.clients.add(queue)
+        return queue
+
+    def disconnect(self, queue):
+        self.clients.discard(queue)
+
+
+def _is_authenticated(flask_app, request):
+    """True if the request carries a Flask-Login session of an active panel user.
+
+    The user id is resolved like login_manager.user_loader does, so a
+    deactivated staff member or removed admin is refused even with a still
+    valid cookie. Blocking (identity may query the database); run in a thread.
+    """
+    import identity
+
+    cookie = request.cookies.get(flask_app.config.get('SESSION_COOKIE_NAME', 'session'))
+    if not cookie:
+        return False
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        data = serializer.loads(cookie)
+    except Exception:
+        return False
+    user_id = data.get('_user_id')
+    if not user_id:
+        return False
+    with flask_app.app_context():
+        return identity.load(user_id) is not None
+
+
+def _cors_headers(request):
+    """Allow the dashboard served from another port of the same host"""
+    origin = request.headers.get('Origin')
+    if not origin or urlsplit(origin).hostname != request.url.host:
+        return {}
+    return {
+        'Access-Control-Allow-Origin': origin,
+        'Access-Control-Allow-Credentials': 'true',
+        'Vary': 'Origin',
+    }
+
+
+def _format(seq, payload):
+    if payload is None:
+        return f"event: ban\ndata: {json.dumps(_RESYNC)}\n\n".encode()
+    return f"id: {seq}\nevent: ban\ndata: {payload}\n\n".encode()
+
+
+async def stream_handler(request):
+    flask_app = request.app[FLASK_APP_KEY]
+    hub = request.app[HUB_KEY]
+    headers = _cors_headers(request)
+
+    if not await asyncio.to_thread(_is_authenticated, flask_app, request):
+        return web.json_response({'success': False, 'error': 'Não autenticado'},
+                                 status=401, headers=headers)
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        **headers,
+    })
+    await response.prepare(request)
+
+    queue = hub.connect()
+    try:
+        await response.write(b"retry: 5000\n\n")
+
+        last_id = request.headers.get('Last-Event-ID')
+        if last_id:
+            try:
+                missed = hub.replay_since(int(last_id))
+            except ValueError:
+                missed = None
+            if missed is None:
+                await response.write(_format(None, None))
+            else:
+                for seq, payload in missed:
+                    await response.write(_format(seq, payload))
+
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=BAN_STREAM_HEARTBEAT)
+            except asyncio.TimeoutError:
+                await response.write(b": ping\n\n")
+                continue
+            if item is None:
+                await response.write(_format(None, None))
+            else:
+                await response.write(_format(*item))
+    except (ConnectionResetError, asyncio.CancelledError):
+        pass
+    finally:
+        hub.disconnect(queue)
+    return response
+
+
+async def stats_handler(request):
+    hub = request.app[HUB_KEY]
+    return web.json_response({
+        'success': True,
+        'clients': len(hub.clients),
+        'last_event_id': hub.seq,
+    }, headers=_cors_headers(request))
+
+
+async def health_handler(request):
+    return web.json_response({'status': 'ok', 'clients': len(request.app[HUB_KEY].clients)})
+
+
+def _listen_postgres(engine, loop, hub):
+    """Forward pg_notify events to the hub; reconnects on failure"""
+    while True:
+        raw = None
+        try:
+            raw = engine.raw_connection()
+            raw.detach()
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {ban_events.CHANNEL}")
+            # Anything committed while we were disconnected is lost
+            loop.call_soon_threadsafe(hub.resync)
+            logging.info("Ban stream listening for database notifications")
+
+            while True:
+                if select.select([conn], [], [], 5) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    loop.call_soon_threadsafe(hub.broadcast, notify.payload)
+        except Exception as e:
+            logging.error(f"Ban stream listener error: {e}")
+            time.sleep(5)
+        finally:
+            if raw is not None:
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+
+
+def create_stream_app(flask_app, loop):
+    """aiohttp application serving the stream, fed from ban_events"""
+    from extensions import db
+
+    hub = BanStreamHub()
+    stream_app = web.Application()
+    stream_app[FLASK_APP_KEY] = flask_app
+    stream_app[HUB_KEY] = hub
+    stream_app.router.add_get('/api/bans/stream', stream_handler)
+    stream_app.router.add_get('/api/bans/stream/stats', stats_handler)
+    stream_app.router.add_get('/healthz', health_handler)
+
+    with flask_app.app_context():
+        engine = db.engine
+    if engine.dialect.name == 'postgresql':
+        threading.Thread(target=_listen_postgres, args=(engine, loop, hub),
+                         name='ban-stream-listener', daemon=True).start()
+    else:
+        ban_events.subscribe(lambda payload: loop.call_soon_threadsafe(hub.broadcast, payload))
+    return stream_app
+
+
+def run_stream_server(flask_app, host=BAN_STREAM_HOST, port=BAN_STREAM_PORT):
+    """Serve the stream forever on a new event loop (blocks)"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    stream_app = create_stream_app(flask_app, loop)
+    runner = web.AppRunner(stream_app)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, host, port).start())
+    logging.info(f"Ban stream serving on {host}:{port}")
+    loop.run_forever()
+
+
+def start_stream_server(flask_app, host=BAN_STREAM_HOST, port=BAN_STREAM_PORT):
+    """Run the stream server in a daemon thread of this process"""
+    thread = threading.Thread(target=run_stream_server, args=(flask_app, host, port),
+                              name='ban-stream', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    from app import app
+    run_stream_server(app)
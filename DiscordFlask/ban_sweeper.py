@@ -0,0 +1,215 @@
+import os
+import time
+import fcntl
+import logging
+import tempfile
+import threading
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import text, update
+
+import ban_events
+import ban_version
+
+# Deactivates temporary bans whose expires_at has passed so readers do not
+# have to re-check expiry and the is_active set stops growing forever.
+SWEEP_INTERVAL = int(os.environ.get("BAN_SWEEP_INTERVAL", "60"))
+SWEEP_BATCH_SIZE = int(os.environ.get("BAN_SWEEP_BATCH_SIZE", "500"))
+SWEEP_LOCK_FILE = os.environ.get(
+    "BAN_SWEEP_LOCK_FILE", os.path.join(tempfile.gettempdir(), "banpanel_sweeper.lock"))
+
+# pg_advisory_lock key shared by every process running a sweeper ("BANS")
+_ADVISORY_LOCK_KEY = 0x42414E53
+
+_stats_lock = threading.Lock()
+_stats = {
+    'runs': 0,
+    'swept_total': 0,
+    'last_swept': 0,
+    'last_run_at': None,
+    'last_duration': 0.0,
+    'errors': 0,
+    'is_leader': False,
+    'interval': None,
+}
+_recent_runs = deque(maxlen=20)
+
+
+def sweep_expired(batch_size=None):
+    """Deactivate every lapsed temporary ban with batched UPDATEs.
+
+    Must be called inside an application context. Returns the list of
+    (ban id, player id) pairs that were swept.
+    """
+    from extensions import db
+    from models import GameBan
+
+    batch_size = batch_size or SWEEP_BATCH_SIZE
+    swept = []
+    while True:
+        now = datetime.now()
+        # Range scan on (is_active, expires_at)
+        batch = (db.session.query(GameBan.id)
+                 .filter(GameBan.is_active == True, GameBan.expired)
+                 .order_by(GameBan.expires_at)
+                 .limit(batch_size)
+                 .all())
+        if not batch:
+            break
+
+        # Bans removed since the SELECT are skipped, so they get no 'expired'
+        # event after their 'removed' one
+        deactivated = db.session.execute(
+            update(GameBan.__table__)
+            .where(GameBan.id.in_([ban_id for ban_id, in batch]), GameBan.is_active == True)
+            .values(is_active=False, updated_at=now)
+            .returning(GameBan.id, GameBan.player_id, GameBan.expires_at)
+        ).all()
+        for ban_id, player_id, expires_at in deactivated:
+            ban_events.publish('expired', ban_id, player_id, expires_at)
+        if deactivated:
+            ban_version.bump()
+        db.session.commit()
+        swept.extend((ban_id, player_id) for ban_id, player_id, _ in deactivated)
+
+        if len(batch) < batch_size:
+            break
+    return swept
+
+
+class LeaderLock:
+    """Makes sure only one process sweeps, however many workers run it.
+
+    PostgreSQL uses a session-level advisory lock held on a dedicated
+    connection; other databases fall back to an exclusive lock file. Either
+    lock is released automatically when the holding process dies, so another
+    worker takes over on its next tick.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._conn = None
+        self._file = None
+
+    def acquire(self):
+        """Return True if this process is (still) the leader"""
+        if self.engine.dialect.name == 'postgresql':
+            return self._acquire_advisory()
+        return self._acquire_file()
+
+    def _acquire_advisory(self):
+        if self._conn is not None:
+            try:
+                self._conn.execute(text("SELECT 1"))
+                self._conn.commit()
+                return True
+            except Exception:
+                logging.warning("Sweeper lost its leader connection, re-electing")
+                self._release_conn()
+
+        conn = self.engine.connect()
+        try:
+            got = conn.execute(text("SELECT pg_try_advisory_lock(:key)"),
+                               {'key': _ADVISORY_LOCK_KEY}).scalar()
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if not got:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def _release_conn(self):
+        try:
+            self._conn.invalidate()
+        except Exception:
+            pass
+        self._conn = None
+
+    def _acquire_file(self):
+        if self._file is not None:
+            return True
+        handle = open(SWEEP_LOCK_FILE, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._file = handle
+        return True
+
+    def release(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _record_run(swept, duration):
+    with _stats_lock:
+        _stats['runs'] += 1
+        _stats['swept_total'] += swept
+        _stats['last_swept'] = swept
+        _stats['last_run_at'] = datetime.now().isoformat()
+        _stats['last_duration'] = duration
+        _recent_runs.append({
+            'at': _stats['last_run_at'],
+            'swept': swept,
+            'duration': round(duration, 4),
+        })
+
+
+def get_stats():
+    """Counters of the sweeper running in this process"""
+    with _stats_lock:
+        stats = dict(_stats)
+        stats['recent_runs'] = list(_recent_runs)
+        stats['batch_size'] = SWEEP_BATCH_SIZE
+        return stats
+
+
+def _run(app, stop_event, interval):
+    from extensions import db
+
+    with app.app_context():
+        lock = LeaderLock(db.engine)
+    with _stats_lock:
+        _stats['interval'] = interval
+
+    while not stop_event.is_set():
+        with app.app_context():
+            try:
+                is_leader = lock.acquire()
+                with _stats_lock:
+                    _stats['is_leader'] = is_leader
+                if is_leader:
+                    started = time.monotonic()
+                    swept = sweep_expired()
+                    duration = time.monotonic() - started
+                    _record_run(len(swept), duration)
+                    if swept:
+                        logging.info(f"Sweeper deactivated {len(swept)} expired bans in {duration:.3f}s")
+            except Exception as e:
+                with _stats_lock:
+                    _stats['errors'] += 1
+                logging.error(f"Error sweeping expired bans: {e}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+        stop_event.wait(interval)
+
+    lock.release()
+
+
+def start_sweeper(app, interval=None):
+    """Start the sweeper in a daemon thread; returns an Event that stops it"""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=_run, args=(app, stop_event, interval or SWEEP_INTERVAL),
+                              name='ban-sweeper', daemon=True)
+    thread.start()
+    return stop_event
@@ -0,0 +1,122 @@
+import os
+import time
+import threading
+
+from sqlalchemy import event, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+# Monotonic version of the ban set, stored in the single ban_set_version row.
+# Every path that adds, removes or sweeps bans calls bump() inside its own
+# transaction, so the counter moves exactly when committed data changes and
+# every worker process sees the same value. Readers use it to build ETags.
+#
+# bump() only marks the transaction: the UPDATE runs from before_commit as
+# its last statement. Ban writes therefore hold the row lock on
+# ban_set_version only while they commit, and a long transaction (a bulk
+# import) does not block other bans, unbans or sweeper batches; concurrent
+# writers queue on that row just for each other's commits.
+#
+# current() keeps the value in memory for BAN_VERSION_TTL seconds so a burst of
+# conditional requests costs one primary-key read. Commits in this process
+# that bumped the version drop the cached value at once; changes made by
+# other processes are picked up within the TTL (set it to 0 to always read).
+BAN_VERSION_TTL = float(os.environ.get("BAN_VERSION_TTL", "1.0"))
+
+# Readers that page by updated_at (GET /api/bans/changes, the snapshot's
+# incremental reload) hold back the newest rows, assuming the transaction
+# that stamped them has committed by then. BAN_WRITE_MAX_SECONDS makes that
+# a rule: committing a bumped transaction fails, and it rolls back, when it
+# began longer ago than this. Their hold-back windows must stay above it.
+BAN_WRITE_MAX_SECONDS = float(os.environ.get("BAN_WRITE_MAX_SECONDS", "20"))
+
+_ROW_ID = 1
+_lock = threading.Lock()
+_cached = None
+_cached_at = 0.0
+
+
+def ensure_version_row():
+    """Create the counter row if missing. Must be called inside an app context"""
+    from extensions import db
+    from models import BanSetVersion
+
+    if db.session.get(BanSetVersion, _ROW_ID) is not None:
+        return
+    try:
+        db.session.add(BanSetVersion(id=_ROW_ID, version=0))
+        db.session.commit()
+    except IntegrityError:
+        # Another worker created it first
+        db.session.rollback()
+
+
+def bump():
+    """Increment the version when the current transaction commits; the caller commits"""
+    from extensions import db
+    db.session.info['ban_version_bumped'] = True
+
+
+def current():
+    """The committed ban-set version. Must be called inside an app context"""
+    global _cached, _cached_at
+    from extensions import db
+    from models import BanSetVersion
+
+    with _lock:
+        if _cached is not None and time.monotonic() - _cached_at < BAN_VERSION_TTL:
+            return _cached
+
+    version = db.session.query(BanSetVersion.version).filter(BanSetVersion.id == _ROW_ID).scalar() or 0
+    with _lock:
+        _cached = version
+        _cached_at = time.monotonic()
+    return version
+
+
+def invalidate():
+    """Forget the cached version so the next current() reads the database"""
+    global _cached
+    with _lock:
+        _cached = None
+
+
+@event.listens_for(Session, 'after_begin')
+def _after_begin(session, transaction, connection):
+    session.info.setdefault('ban_transaction_started', time.monotonic())
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _after_transaction_end(session, transaction):
+    # Commit, rollback or close of the outermost transaction
+    if transaction.parent is None:
+        session.info.pop('ban_transaction_started', None)
+
+
+@event.listens_for(Session, 'before_commit')
+def _before_commit(session):
+    from models import BanSetVersion
+
+    if not session.info.get('ban_version_bumped'):
+        return
+    # Pending ORM changes first, so the lock below is held only for the commit
+    session.flush()
+    session.execute(update(BanSetVersion)
+                    .where(BanSetVersion.id == _ROW_ID)
+                    .values(version=BanSetVersion.version + 1))
+
+    started = session.info.get('ban_transaction_started')
+    if started is not None and time.monotonic() - started > BAN_WRITE_MAX_SECONDS:
+        raise RuntimeError(f'Transação excedeu {BAN_WRITE_MAX_SECONDS:g}s; '
+                           f'nenhuma alteração foi gravada')
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('ban_version_bumped', False):
+        invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('ban_version_bumped', None)
@@ -0,0 +1,300 @@
+"""Latency and query-count benchmark for the web API and bot queries.
+
+For each table size, recreates the schema, seeds synthetic bans (see
+seed.py) and replays every case through the Flask test client (bot cases
+call the bot's query helpers directly), recording p50/p99 latency,
+sequential throughput and SQL statements per request:
+
+    python benchmarks/api.py [--sizes 10000,100000,1000000] [--requests 200]
+                             [--database-url URL] [--output FILE] [--compare FILE]
+
+Without --database-url each size runs on a fresh SQLite file in a temporary
+directory. A given --database-url must point at a throwaway database: its
+tables are dropped and recreated for every size. --output writes the results
+as JSON; --compare prints the change against such a file from another commit.
+On SQLite the search case is skipped (listed under "skipped") at sizes where
+seed.py leaves the n-gram search index empty.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+BATCH_SIZE = 100
+
+
+def _percentile(sorted_values, fraction):
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class QueryCounter:
+    """Counts statements sent to the database"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+_counter = None
+
+
+def _query_counter(engine):
+    # One listener per engine; sizes reuse it
+    global _counter
+    if _counter is None:
+        _counter = QueryCounter(engine)
+    return _counter
+
+
+def _measure(name, case, setup, requests, warmup, counter):
+    """Run case() requests times; setup() runs untimed before each call"""
+    for _ in range(warmup):
+        setup()
+        case()
+    timings = []
+    queries = 0
+    for _ in range(requests):
+        setup()
+        counter.count = 0
+        started = time.perf_counter()
+        case()
+        timings.append(time.perf_counter() - started)
+        queries += counter.count
+    timings.sort()
+    result = {
+        'requests': requests,
+        'p50_ms': round(statistics.median(timings) * 1000, 3),
+        'p99_ms': round(_percentile(timings, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'throughput_rps': round(requests / sum(timings), 1),
+        'queries_per_request': round(queries / requests, 2),
+    }
+    print(f"  {name:24} p50 {result['p50_ms']:9.3f} ms  p99 {result['p99_ms']:9.3f} ms  "
+          f"{result['throughput_rps']:9.1f} req/s  {result['queries_per_request']:6.2f} queries")
+    return result
+
+
+def _get(client, url, expected=200, **kwargs):
+    def call():
+        response = client.get(url() if callable(url) else url, **kwargs)
+        if response.status_code != expected:
+            raise RuntimeError(f"GET {response.request.path}: {response.status_code}")
+    return call
+
+
+def _reset_caches():
+    import ban_cache
+    import ban_version
+    import bot_cache
+    import identity
+    ban_cache.clear()
+    bot_cache.clear()
+    identity.clear()
+    ban_version.invalidate()
+
+
+def _search_indexed(engine, rows):
+    """False where seed.py left the SQLite n-gram search index empty"""
+    from seed import SEARCH_INDEX_MAX_ROWS
+    return engine.dialect.name == 'postgresql' or rows <= SEARCH_INDEX_MAX_ROWS
+
+
+def _cases(app, client, rows, rng):
+    """{name: (case, setup)} for one seeded table"""
+    from sqlalchemy import select
+    import ban_cache
+    import ban_repository
+    from app import db
+    from models import GameBan
+    from seed import player_id, NAME_PARTS
+
+    players = max(1, int(rows * 0.8))
+
+    def random_player():
+        # One in ten lookups is for a player that was never banned
+        if rng.random() < 0.1:
+            return f"UNKNOWN{rng.randrange(10 ** 9)}"
+        return player_id(rng.randrange(players))
+
+    with app.app_context():
+        middle = db.session.execute(
+            select(GameBan.created_at, GameBan.id).where(GameBan.is_active == True)
+            .order_by(GameBan.created_at.desc(), GameBan.id.desc())
+            .offset(int(rows * 0.4)).limit(1)
+        ).first()
+        search_indexed = _search_indexed(db.engine, rows)
+    deep_cursor = ban_repository._encode_key(*middle) if middle else ''
+    etag = client.get('/api/bans').headers.get('ETag')
+
+    def nothing():
+        pass
+
+    def check_batch():
+        response = client.post('/api/bans/check',
+                               json={'player_ids': [random_player() for _ in range(BATCH_SIZE)]})
+        if response.status_code != 200:
+            raise RuntimeError(f"POST /api/bans/check: {response.status_code}")
+
+    cases = {
+        'index': (_get(client, '/'), nothing),
+        'bans_first_page': (_get(client, '/api/bans?limit=50'), _reset_caches),
+        'bans_deep_page': (_get(client, f'/api/bans?limit=50&cursor={deep_cursor}'), _reset_caches),
+        'bans_filtered': (_get(client, lambda: f'/api/bans?limit=50&ban_type=temporary'
+                                              f'&banned_by=bench{rng.randrange(20)}'), _reset_caches),
+        'bans_not_modified': (_get(client, '/api/bans', expected=304,
+                                   headers={'If-None-Match': etag}), nothing),
+        'check_uncached': (_get(client, lambda: f'/api/bans/check/{random_player()}'), ban_cache.clear),
+        'check_cached': (_get(client, f'/api/bans/check/{player_id(0)}'), nothing),
+        f'check_batch_{BATCH_SIZE}': (check_batch, ban_cache.clear),
+        'search': (_get(client, lambda: f'/api/bans/search?q={rng.choice(NAME_PARTS)}{rng.choice(NAME_PARTS)}'),
+                   nothing),
+        'changes': (_get(client, '/api/bans/changes?limit=500'), nothing),
+    }
+    if not search_indexed:
+        del cases['search']
+
+    import bot_cache
+
+    def in_context(func, *args):
+        def call():
+            with app.app_context():
+                func(*(arg() for arg in args))
+        return call
+
+    total_pages = max(1, players // 10)
+    random_page = lambda: rng.randrange(1, total_pages + 1)
+    cases['bot_banlist_first'] = (in_context(bot_cache.load_ban_page, lambda: 1, lambda: 10), nothing)
+    cases['bot_banlist_random'] = (in_context(bot_cache.load_ban_page, random_page, lambda: 10), nothing)
+    cases['bot_banstats'] = (in_context(bot_cache.load_ban_stats), nothing)
+    # What the bot serves: the same data through the per-version cache
+    cases['bot_banlist_cached'] = (in_context(bot_cache.ban_page, lambda: 1, lambda: 10), nothing)
+    cases['bot_banstats_cached'] = (in_context(bot_cache.ban_stats), nothing)
+    return cases
+
+
+def run_size(rows, args):
+    from app import app, db, init_database
+    from seed import seed, BENCH_PASSWORD
+    import ban_snapshot
+
+    with app.app_context():
+        db.drop_all()
+    init_database()
+    _reset_caches()
+    ban_snapshot.builder = ban_snapshot.SnapshotBuilder()
+    with app.app_context():
+        seconds = seed(db, rows, args.staff, args.seed)
+        counter = _query_counter(db.engine)
+    print(f"{rows} bans seeded in {seconds:.1f}s")
+
+    client = app.test_client()
+    response = client.post('/login', data={'username': 'bench0', 'password': BENCH_PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f"Login failed: {response.status_code}")
+
+    rng = random.Random(args.seed)
+    cases = _cases(app, client, rows, rng)
+    results = {}
+    for name, (case, setup) in cases.items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = _measure(name, case, setup, args.requests, args.warmup, counter)
+    skipped = {}
+    if 'search' not in cases and (not args.only or 'search' in args.only):
+        # Timing it would only measure an empty index
+        skipped['search'] = 'no search index'
+        print(f"  {'search':24} skipped: no search index at this size")
+    return {'seed_seconds': round(seconds, 1), 'cases': results, 'skipped': skipped}
+
+
+def compare(baseline, current):
+    """Print p50/p99/query changes of current against a baseline result file"""
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('database')}):")
+    for size, result in current['results'].items():
+        old_cases = baseline.get('results', {}).get(size, {}).get('cases', {})
+        for name, new in result['cases'].items():
+            old = old_cases.get(name)
+            if not old:
+                continue
+            changes = []
+            for key in ('p50_ms', 'p99_ms'):
+                delta = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                changes.append(f"{key[:3]} {old[key]:8.3f} -> {new[key]:8.3f} ms ({delta:+6.1f}%)")
+            changes.append(f"queries {old['queries_per_request']:g} -> {new['queries_per_request']:g}")
+            print(f"  {size:>8} {name:24} " + '   '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma-separated ban table sizes')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per case')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--staff', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', help='comma-separated case names')
+    parser.add_argument('--database-url')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+    args.only = set(args.only.split(',')) if args.only else None
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    # Run in a scratch directory: the app reads and writes admins.json there
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    workdir = tempfile.mkdtemp(prefix='banpanel-bench-')
+    os.chdir(workdir)
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('SESSION_SECRET', 'benchmark')
+    sys.path[:0] = [APP_DIR, HERE]
+
+    results = {}
+    for rows in sizes:
+        results[str(rows)] = run_size(rows, args)
+
+    report = {
+        'benchmark': 'api',
+        'timestamp': time.time(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'database': database_url.split(':', 1)[0],
+        'requests_per_case': args.requests,
+        'staff': args.staff,
+        'results': results,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if baseline_path:
+        with open(baseline_path) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Synthetic ban data for the benchmarks.
+
+Fills an initialized (empty) database with staff members and game bans:
+
+    python benchmarks/seed.py --rows 100000 [--staff 200] [--database-url URL]
+
+The data is deterministic for a given --rows/--staff/--seed:
+  * player IDs P000000000...; 80% of the rows are the current ban (or last
+    lifted ban) of a distinct player, the rest are lifted earlier bans of
+    the same players, so the one-active-ban-per-player index holds
+  * about 90% of the players are banned right now, 70% permanently
+  * temporary bans run 1 hour to 30 days; 1 in 10 of them has lapsed but
+    was not swept yet
+  * created_at is spread over the last year, banned_by over every staff
+    member (a few staff members issue most of the bans)
+Staff are named bench0...benchN with the password BENCH_PASSWORD.
+"""
+import os
+import sys
+import time
+import random
+import itertools
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+BENCH_PASSWORD = 'bench'
+INSERT_BATCH = 10000
+# Above this many rows the SQLite n-gram search index is not filled (it
+# holds ~25 rows per ban) and api.py skips its search case; PostgreSQL
+# maintains its trigram index itself
+SEARCH_INDEX_MAX_ROWS = 100000
+
+REASONS = (
+    'Uso de cheats', 'Aimbot detectado', 'Wallhack', 'Comportamento tóxico',
+    'Exploração de bug', 'Conta compartilhada', 'Speed hack', 'Spam no chat',
+)
+NAME_PARTS = ('shadow', 'killer', 'pro', 'noob', 'dragon', 'ghost', 'sniper',
+              'wolf', 'ninja', 'storm', 'viper', 'king', 'zero', 'blaze')
+
+
+def player_id(index):
+    return f"P{index:09d}"
+
+
+def player_name(rng):
+    return f"{rng.choice(NAME_PARTS)}{rng.choice(NAME_PARTS)}{rng.randrange(1000)}"
+
+
+def seed_staff(db, count):
+    """Create bench0..bench{count-1}; returns their ids"""
+    from models import Staff
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    rows = [{
+        'username': f'bench{i}',
+        'email': f'bench{i}@bench.local',
+        'password_hash': password_hash,
+        'is_admin': i == 0,
+        'is_active': True,
+    } for i in range(count)]
+    db.session.execute(insert(Staff.__table__), rows)
+    db.session.commit()
+    return [staff.id for staff in Staff.query.filter(Staff.username.like('bench%')).order_by(Staff.id)]
+
+
+def _ban_rows(rows, staff_ids, rng):
+    now = datetime.now()
+    players = max(1, int(rows * 0.8))
+    # Zipf-like weights: a handful of staff members issue most bans
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(staff_ids))))
+    for index in range(rows):
+        if index < players:
+            player_index = index
+            active = rng.random() < 0.9
+        else:
+            player_index = rng.randrange(players)
+            active = False
+        created_at = now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        if rng.random() < 0.7:
+            ban_type, expires_at = 'permanent', None
+        else:
+            ban_type = 'temporary'
+            if active and rng.random() < 0.1:
+                expires_at = now - timedelta(minutes=rng.randrange(1, 600))
+            else:
+                expires_at = now + timedelta(hours=rng.randrange(1, 30 * 24))
+        yield {
+            'player_id': player_id(player_index),
+            'player_name': player_name(rng),
+            'reason': rng.choice(REASONS),
+            'ban_type': ban_type,
+            'expires_at': expires_at,
+            'is_active': active,
+            'created_at': created_at,
+            'updated_at': created_at,
+            'banned_by_id': rng.choices(staff_ids, cum_weights=cum_weights)[0],
+        }
+
+
+def seed_bans(db, rows, staff_ids, seed=42, search_index=None):
+    """Insert rows synthetic bans in batches; returns the number inserted"""
+    from models import GameBan
+    import ban_search
+
+    rng = random.Random(seed)
+    table = GameBan.__table__
+    connection = db.session.connection()
+    if search_index is None:
+        search_index = rows <= SEARCH_INDEX_MAX_ROWS
+    statement = insert(table)
+    if search_index:
+        statement = statement.returning(table.c.id, table.c.player_id, table.c.player_name)
+
+    batch = []
+    for row in _ban_rows(rows, staff_ids, rng):
+        batch.append(row)
+        if len(batch) == INSERT_BATCH:
+            _insert_batch(connection, statement, batch, search_index, ban_search)
+            batch = []
+    if batch:
+        _insert_batch(connection, statement, batch, search_index, ban_search)
+    db.session.commit()
+    return rows
+
+
+def _insert_batch(connection, statement, batch, search_index, ban_search):
+    result = connection.execute(statement, batch)
+    if search_index:
+        ban_search.index_bans(connection, result.all())
+
+
+def seed(db, rows, staff_count=200, seed=42, search_index=None):
+    """Staff plus bans; needs an app context. Returns seconds taken."""
+    started = time.perf_counter()
+    staff_ids = seed_staff(db, staff_count)
+    seed_bans(db, rows, staff_ids, seed=seed, search_index=search_index)
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.exec_driver_sql('VACUUM ANALYZE game_bans')
+    else:
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('ANALYZE')
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--staff', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    sys.path.insert(0, APP_DIR)
+    from app import app, db, init_database
+    init_database()
+    with app.app_context():
+        elapsed = seed(db, args.rows, args.staff, args.seed)
+    print(f"Seeded {args.rows} bans across {args.staff} staff in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
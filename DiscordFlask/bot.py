@@ -1,10 +1,25 @@
 import os
+import sys
+import json
+import math
+import time
+import asyncio
 import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
 import discord
 from discord.ext import commands
-from app import app
+from sqlalchemy import text
+from app import app, db
 from models import Staff, GameBan
 from admin_manager import add_admin, delete_admin, check_admin, add_log
+import ban_cache
+import bot_cache
+import metrics
+import profiling
+import ban_repository
+import ban_search
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -14,6 +29,65 @@ intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix='!', intents=intents)
 
+# Database work runs on a bounded thread pool so a slow query never blocks the
+# gateway heartbeat or other guilds' commands. At most BOT_DB_MAX_INFLIGHT calls
+# run at once and the command gives up after BOT_DB_TIMEOUT seconds. The call
+# keeps its slot until its thread actually returns; the database ends it soon
+# after the timeout (statement_timeout on PostgreSQL, a progress handler that
+# interrupts the running statement on SQLite).
+BOT_DB_MAX_INFLIGHT = int(os.getenv('BOT_DB_MAX_INFLIGHT', '4'))
+BOT_DB_TIMEOUT = float(os.getenv('BOT_DB_TIMEOUT', '10'))
+
+_db_executor = ThreadPoolExecutor(max_workers=BOT_DB_MAX_INFLIGHT, thread_name_prefix='bot-db')
+_db_slots = None
+
+def _with_app_context(func, *args):
+    """Run func inside an app context with its own session, removed afterwards"""
+    with app.app_context():
+        raw = None
+        try:
+            if db.engine.dialect.name == 'postgresql':
+                db.session.execute(text("SELECT set_config('statement_timeout', :ms, true)"),
+                                   {'ms': str(int(BOT_DB_TIMEOUT * 1000))})
+            elif db.engine.dialect.name == 'sqlite':
+                deadline = time.monotonic() + BOT_DB_TIMEOUT
+                raw = db.session.connection().connection.driver_connection
+                raw.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+            return func(*args)
+        finally:
+            if raw is not None:
+                raw.set_progress_handler(None, 0)
+            db.session.remove()
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the bot's DB pool, with the in-flight cap and timeout"""
+    global _db_slots
+    if _db_slots is None:
+        _db_slots = asyncio.Semaphore(BOT_DB_MAX_INFLIGHT)
+    
+    await _db_slots.acquire()
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    # Slow statements are logged with the command that issued them
+    work = _db_executor.submit(profiling.run_with_origin,
+                               profiling.current_origin(), func, *args)
+    # The slot is freed when the thread finishes, not when we stop waiting
+    work.add_done_callback(lambda _: loop.call_soon_threadsafe(_db_slots.release))
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(work), timeout=BOT_DB_TIMEOUT)
+    except asyncio.TimeoutError:
+        metrics.observe_bot_db_call(time.perf_counter() - started, 'timeout')
+        raise TimeoutError(f"Tempo limite de {BOT_DB_TIMEOUT:g}s excedido")
+    except Exception:
+        metrics.observe_bot_db_call(time.perf_counter() - started, 'error')
+        raise
+    metrics.observe_bot_db_call(time.perf_counter() - started, 'ok')
+    return result
+
+async def run_db(func, *args):
+    """Run a database call off the event loop (see run_blocking)"""
+    return await run_blocking(_with_app_context, func, *args)
+
 @bot.event
 async def on_ready():
     """Event triggered when bot is ready"""
@@ -32,145 +106,128 @@ async def check_ban(ctx, player_id: str = None):
         return
     
     try:
-        with app.app_context():
-            ban = GameBan.query.filter_by(player_id=str(player_id), is_active=True).first()
+        ban = await run_db(ban_cache.get_active_ban, player_id)
+        
+        if ban:
+            embed = discord.Embed(
+                title="🚫 Jogador Banido",
+                color=discord.Color.red(),
+                description=f"**ID do Jogador:** {player_id}"
+            )
             
-            if ban and not ban.is_expired():
-                embed = discord.Embed(
-                    title="🚫 Jogador Banido",
-                    color=discord.Color.red(),
-                    description=f"**ID do Jogador:** {player_id}"
-                )
-                
-                if ban.player_name:
-                    embed.add_field(name="Nome", value=ban.player_name, inline=True)
-                
-                embed.add_field(name="Motivo", value=ban.reason, inline=False)
-                embed.add_field(name="Tipo", value="Permanente" if ban.ban_type == 'permanent' else "Temporário", inline=True)
-                embed.add_field(name="Banido por", value=ban.staff_member.username, inline=True)
-                embed.add_field(name="Data", value=ban.created_at.strftime('%d/%m/%Y %H:%M'), inline=True)
-                
-                if ban.ban_type == 'temporary' and ban.expires_at:
-                    embed.add_field(name="Expira em", value=ban.expires_at.strftime('%d/%m/%Y %H:%M'), inline=True)
-                    remaining = ban.time_remaining()
-                    if remaining:
-                        embed.add_field(name="Tempo restante", value=str(remaining).split('.')[0], inline=True)
-                
-                await ctx.send(embed=embed)
-            else:
-                embed = discord.Embed(
-                    title="✅ Jogador Liberado",
-                    color=discord.Color.green(),
-                    description=f"**ID do Jogador:** {player_id}\n\nEste jogador não está banido."
-                )
-                await ctx.send(embed=embed)
+            if ban.player_name:
+                embed.add_field(name="Nome", value=ban.player_name, inline=True)
             
+            embed.add_field(name="Motivo", value=ban.reason, inline=False)
+            embed.add_field(name="Tipo", value="Permanente" if ban.ban_type == 'permanent' else "Temporário", inline=True)
+            embed.add_field(name="Banido por", value=ban.banned_by, inline=True)
+            embed.add_field(name="Data", value=ban.created_at.strftime('%d/%m/%Y %H:%M'), inline=True)
+            
+            if ban.ban_type == 'temporary' and ban.expires_at:
+                embed.add_field(name="Expira em", value=ban.expires_at.strftime('%d/%m/%Y %H:%M'), inline=True)
+                remaining = ban.time_remaining()
+                if remaining:
+                    embed.add_field(name="Tempo restante", value=str(remaining).split('.')[0], inline=True)
+            
+            await ctx.send(embed=embed)
+        else:
+            embed = discord.Embed(
+                title="✅ Jogador Liberado",
+                color=discord.Color.green(),
+                description=f"**ID do Jogador:** {player_id}\n\nEste jogador não está banido."
+            )
+            await ctx.send(embed=embed)
+        
     except Exception as e:
         logging.error(f"Error checking ban for {player_id}: {e}")
+        ctx.metrics_status = 'error'
         await ctx.send(f"❌ Erro ao verificar ban: {str(e)}")
 
 @bot.command(name='banlist')
 async def ban_list(ctx, page: int = 1):
     """Show list of banned players"""
     try:
-        with app.app_context():
-            # Get active bans
-            all_bans = GameBan.query.filter_by(is_active=True).order_by(GameBan.created_at.desc()).all()
-            active_bans = [ban for ban in all_bans if not ban.is_expired()]
-            
-            if not active_bans:
-                embed = discord.Embed(
-                    title="📋 Lista de Bans",
-                    color=discord.Color.blue(),
-                    description="Não há jogadores banidos no momento."
-                )
-                await ctx.send(embed=embed)
-                return
-            
-            # Pagination
-            items_per_page = 5
-            total_pages = (len(active_bans) + items_per_page - 1) // items_per_page
-            page = max(1, min(page, total_pages))
-            start_idx = (page - 1) * items_per_page
-            end_idx = start_idx + items_per_page
-            page_bans = active_bans[start_idx:end_idx]
-            
-            # Create embed
+        # Count bans in force and fetch only the requested page (cached per ban-set version)
+        items_per_page = 5
+        active_count, page, page_bans = await run_db(bot_cache.ban_page, page, items_per_page)
+        
+        if not active_count:
             embed = discord.Embed(
-                title="📋 Lista de Jogadores Banidos",
-                color=discord.Color.orange(),
-                description=f"**Total de bans ativos:** {len(active_bans)}\n**Página {page} de {total_pages}**"
+                title="📋 Lista de Bans",
+                color=discord.Color.blue(),
+                description="Não há jogadores banidos no momento."
             )
+            await ctx.send(embed=embed)
+            return
+        
+        total_pages = (active_count + items_per_page - 1) // items_per_page
+        
+        # Create embed
+        embed = discord.Embed(
+            title="📋 Lista de Jogadores Banidos",
+            color=discord.Color.orange(),
+            description=f"**Total de bans ativos:** {active_count}\n**Página {page} de {total_pages}**"
+        )
+        
+        for ban in page_bans:
+            ban_info = f"**Motivo:** {ban.reason[:100]}{'...' if len(ban.reason) > 100 else ''}"
+            ban_info += f"\n**Tipo:** {'Permanente' if ban.ban_type == 'permanent' else 'Temporário'}"
+            ban_info += f"\n**Por:** {ban.banned_by}"
+            ban_info += f"\n**Data:** {ban.created_at.strftime('%d/%m/%Y')}"
             
-            for ban in page_bans:
-                ban_info = f"**Motivo:** {ban.reason[:100]}{'...' if len(ban.reason) > 100 else ''}"
-                ban_info += f"\n**Tipo:** {'Permanente' if ban.ban_type == 'permanent' else 'Temporário'}"
-                ban_info += f"\n**Por:** {ban.staff_member.username}"
-                ban_info += f"\n**Data:** {ban.created_at.strftime('%d/%m/%Y')}"
-                
-                if ban.ban_type == 'temporary' and ban.expires_at:
-                    remaining = ban.time_remaining()
-                    if remaining:
-                        ban_info += f"\n**Expira em:** {str(remaining).split('.')[0]}"
-                
-                player_title = f"{ban.player_id}"
-                if ban.player_name:
-                    player_title += f" ({ban.player_name})"
-                
-                embed.add_field(
-                    name=player_title,
-                    value=ban_info,
-                    inline=False
-                )
+            if ban.ban_type == 'temporary' and ban.expires_at:
+                remaining = ban.time_remaining()
+                if remaining:
+                    ban_info += f"\n**Expira em:** {str(remaining).split('.')[0]}"
             
-            if total_pages > 1:
-                embed.set_footer(text=f"Use !banlist {page + 1} para ver a próxima página" if page < total_pages else "Esta é a última página")
+            player_title = f"{ban.player_id}"
+            if ban.player_name:
+                player_title += f" ({ban.player_name})"
             
-            await ctx.send(embed=embed)
+            embed.add_field(
+                name=player_title,
+                value=ban_info,
+                inline=False
+            )
+        
+        if total_pages > 1:
+            embed.set_footer(text=f"Use !banlist {page + 1} para ver a próxima página" if page < total_pages else "Esta é a última página")
+        
+        await ctx.send(embed=embed)
         
     except Exception as e:
         logging.error(f"Error getting ban list: {e}")
+        ctx.metrics_status = 'error'
         await ctx.send(f"❌ Erro ao obter lista de bans: {str(e)}")
 
 @bot.command(name='banstats')
 async def ban_stats(ctx):
     """Show ban statistics"""
     try:
-        with app.app_context():
-            all_bans = GameBan.query.filter_by(is_active=True).all()
-            active_bans = [ban for ban in all_bans if not ban.is_expired()]
-            permanent_bans = [ban for ban in active_bans if ban.ban_type == 'permanent']
-            temporary_bans = [ban for ban in active_bans if ban.ban_type == 'temporary']
-            
-            embed = discord.Embed(
-                title="📊 Estatísticas de Bans",
-                color=discord.Color.blue()
-            )
-            
-            embed.add_field(name="Total de Bans", value=str(len(all_bans)), inline=True)
-            embed.add_field(name="Bans Ativos", value=str(len(active_bans)), inline=True)
-            embed.add_field(name="Bans Permanentes", value=str(len(permanent_bans)), inline=True)
-            embed.add_field(name="Bans Temporários", value=str(len(temporary_bans)), inline=True)
-            
-            if active_bans:
-                # Count by staff member
-                staff_counts = {}
-                for ban in active_bans:
-                    staff_name = ban.staff_member.username
-                    staff_counts[staff_name] = staff_counts.get(staff_name, 0) + 1
-                
-                # Get most active staff
-                if staff_counts:
-                    top_staff = max(staff_counts.items(), key=lambda x: x[1])
-                    embed.add_field(name="Staff Mais Ativo", value=f"{top_staff[0]} ({top_staff[1]} bans)", inline=True)
-            
-            embed.add_field(name="Status do Bot", value="🟢 Online", inline=True)
-            embed.add_field(name="Servidor do Jogo", value="🎮 Monitorando", inline=True)
-            
-            await ctx.send(embed=embed)
+        counts, top_staff = await run_db(bot_cache.ban_stats)
+        
+        embed = discord.Embed(
+            title="📊 Estatísticas de Bans",
+            color=discord.Color.blue()
+        )
+        
+        embed.add_field(name="Total de Bans", value=str(counts['total']), inline=True)
+        embed.add_field(name="Bans Ativos", value=str(counts['active']), inline=True)
+        embed.add_field(name="Bans Permanentes", value=str(counts['permanent']), inline=True)
+        embed.add_field(name="Bans Temporários", value=str(counts['temporary']), inline=True)
+        
+        # Most active staff, grouped in SQL
+        if top_staff:
+            embed.add_field(name="Staff Mais Ativo", value=f"{top_staff[0][0]} ({top_staff[0][1]} bans)", inline=True)
+        
+        embed.add_field(name="Status do Bot", value="🟢 Online", inline=True)
+        embed.add_field(name="Servidor do Jogo", value="🎮 Monitorando", inline=True)
+        
+        await ctx.send(embed=embed)
         
     except Exception as e:
         logging.error(f"Error getting ban stats: {e}")
+        ctx.metrics_status = 'error'
         await ctx.send(f"❌ Erro ao obter estatísticas: {str(e)}")
 
 @bot.command(name='search')
@@ -181,49 +238,45 @@ async def search_player(ctx, *, search_term: str = None):
         return
     
     try:
-        with app.app_context():
-            # Search by player ID or name
-            bans = GameBan.query.filter(
-                GameBan.is_active == True,
-                (GameBan.player_id.ilike(f'%{search_term}%') | 
-                 GameBan.player_name.ilike(f'%{search_term}%'))
-            ).order_by(GameBan.created_at.desc()).limit(5).all()
-            
-            if not bans:
-                embed = discord.Embed(
-                    title="🔍 Busca de Jogadores",
-                    color=discord.Color.yellow(),
-                    description=f"Nenhum resultado encontrado para: **{search_term}**"
-                )
-                await ctx.send(embed=embed)
-                return
-            
+        # Search by player ID or name
+        bans = await run_db(ban_search.search_bans, search_term, 5)
+        
+        if not bans:
             embed = discord.Embed(
-                title="🔍 Resultados da Busca",
-                color=discord.Color.blue(),
-                description=f"**Termo buscado:** {search_term}\n**Resultados encontrados:** {len(bans)}"
+                title="🔍 Busca de Jogadores",
+                color=discord.Color.yellow(),
+                description=f"Nenhum resultado encontrado para: **{search_term}**"
             )
+            await ctx.send(embed=embed)
+            return
+        
+        embed = discord.Embed(
+            title="🔍 Resultados da Busca",
+            color=discord.Color.blue(),
+            description=f"**Termo buscado:** {search_term}\n**Resultados encontrados:** {len(bans)}"
+        )
+        
+        for ban in bans:
+            status = "Ativo" if not ban.is_expired() else "Expirado"
+            player_title = f"{ban.player_id}"
+            if ban.player_name:
+                player_title += f" ({ban.player_name})"
             
-            for ban in bans:
-                status = "Ativo" if not ban.is_expired() else "Expirado"
-                player_title = f"{ban.player_id}"
-                if ban.player_name:
-                    player_title += f" ({ban.player_name})"
-                
-                ban_info = f"**Status:** {status}\n**Motivo:** {ban.reason[:100]}{'...' if len(ban.reason) > 100 else ''}"
-                ban_info += f"\n**Tipo:** {'Permanente' if ban.ban_type == 'permanent' else 'Temporário'}"
-                ban_info += f"\n**Data:** {ban.created_at.strftime('%d/%m/%Y')}"
-                
-                embed.add_field(
-                    name=player_title,
-                    value=ban_info,
-                    inline=False
-                )
+            ban_info = f"**Status:** {status}\n**Motivo:** {ban.reason[:100]}{'...' if len(ban.reason) > 100 else ''}"
+            ban_info += f"\n**Tipo:** {'Permanente' if ban.ban_type == 'permanent' else 'Temporário'}"
+            ban_info += f"\n**Data:** {ban.created_at.strftime('%d/%m/%Y')}"
             
-            await ctx.send(embed=embed)
+            embed.add_field(
+                name=player_title,
+                value=ban_info,
+                inline=False
+            )
+        
+        await ctx.send(embed=embed)
         
     except Exception as e:
         logging.error(f"Error searching for player {search_term}: {e}")
+        ctx.metrics_status = 'error'
         await ctx.send(f"❌ Erro na busca: {str(e)}")
 
 @bot.command(name='addadmin')
@@ -232,7 +285,7 @@ async def add_admin_command(ctx, username: str, password: str):
     # Verifica se o autor do comando é um admin
     author_name = str(ctx.author)
     
-    if add_admin(username, password):
+    if await run_blocking(add_admin, username, password):
         add_log("AddAdmin (Discord)", username, author_name)
         await ctx.send(f"✅ Admin `{username}` criado com sucesso!")
     else:
@@ -243,7 +296,7 @@ async def delete_admin_command(ctx, username: str):
     """Deleta um admin existente."""
     author_name = str(ctx.author)
     
-    if delete_admin(username):
+    if await run_blocking(delete_admin, username):
         add_log("DelAdmin (Discord)", username, author_name)
         await ctx.send(f"🗑 Admin `{username}` foi removido!")
     else:
@@ -282,6 +335,7 @@ async def list_admins_command(ctx):
         
     except Exception as e:
         logging.error(f"Error listing admins: {e}")
+        ctx.metrics_status = 'error'
         await ctx.send(f"❌ Erro ao listar administradores: {str(e)}")
 
 @bot.command(name='help_game')
@@ -320,27 +374,94 @@ async def help_game(ctx):
     
     await ctx.send(embed=embed)
 
+@bot.before_invoke
+async def start_command_timer(ctx):
+    """Remember when a command started, for its latency metric"""
+    ctx.metrics_started = time.perf_counter()
+    profiling.set_origin(f"!{ctx.command.qualified_name}")
+
+@bot.event
+async def on_command_completion(ctx):
+    # Commands catch their own errors and reply; they flag them in metrics_status
+    metrics.observe_bot_command(ctx, getattr(ctx, 'metrics_status', 'ok'))
+
 @bot.event
 async def on_command_error(ctx, error):
     """Handle command errors"""
     if isinstance(error, commands.CommandNotFound):
         return  # Ignore unknown commands
     elif isinstance(error, commands.MissingRequiredArgument):
+        metrics.observe_bot_command(ctx, 'user_error')
         await ctx.send(f"❌ Argumento obrigatório faltando. Use `!help_game` para ajuda.")
     elif isinstance(error, commands.BadArgument):
+        metrics.observe_bot_command(ctx, 'user_error')
         await ctx.send(f"❌ Argumento inválido. Use `!help_game` para ajuda.")
     else:
+        metrics.observe_bot_command(ctx, 'error')
         logging.error(f"Command error: {error}")
         await ctx.send(f"❌ Ocorreu um erro: {str(error)}")
 
 def run_bot():
-    """Run the Discord bot"""
+    """Run the Discord bot. Returns False if it stopped because of an error"""
     token = os.getenv('DISCORD_BOT_TOKEN')
     if not token:
         logging.warning("DISCORD_BOT_TOKEN environment variable not found! Bot will not start.")
-        return
+        return None
     
     try:
         bot.run(token)
+        return True
     except Exception as e:
-        logging.error(f"Error running bot: {e}")
\ No newline at end of file
+        logging.error(f"Error running bot: {e}")
+        return False
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    """GET /healthz: 200 while the bot is connected to Discord, else 503.
+    GET /metrics: Prometheus metrics of the bot process"""
+    
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send_metrics()
+            return
+        if self.path != '/healthz':
+            self.send_error(404)
+            return
+        ready = bot.is_ready() and not bot.is_closed()
+        body = json.dumps({
+            'status': 'ok' if ready else 'unavailable',
+            'ready': ready,
+            'guilds': len(bot.guilds) if ready else 0,
+            'latency': round(bot.latency, 4) if ready and not math.isnan(bot.latency) else None,
+            'pid': os.getpid()
+        }).encode()
+        self.send_response(200 if ready else 503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_metrics(self):
+        if not metrics.authorized(self.headers.get('Authorization')):
+            self.send_error(401)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', metrics.CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_health_server(port=None):
+    """Serve the bot health check on BOT_HEALTH_PORT from a daemon thread"""
+    port = port or int(os.getenv('BOT_HEALTH_PORT', '5002'))
+    server = ThreadingHTTPServer(('0.0.0.0', port), _HealthHandler)
+    threading.Thread(target=server.serve_forever, name='bot-health', daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    # Standalone bot process (see serve.py)
+    start_health_server()
+    sys.exit(1 if run_bot() is False else 0)
\ No newline at end of file
@@ -0,0 +1,98 @@
+import os
+import threading
+from datetime import datetime
+
+import ban_repository
+import ban_version
+from cache import ExpiringLRUCache
+
+# Cached data behind the bot's !banlist pages and !banstats, so a channel
+# spamming these commands costs one version lookup per command.
+#
+# Entries are keyed by the ban-set version, which every ban mutation bumps
+# (web, API, bulk import and the sweeper, in any process), so a change makes
+# the old entries unreachable. A temporary ban lapsing does not bump the
+# version until the sweeper runs, so entries also expire at the next expiry
+# among the bans in force, and after BOT_CACHE_TTL seconds at most.
+BOT_CACHE_SIZE = int(os.environ.get("BOT_CACHE_SIZE", "1000"))
+BOT_CACHE_TTL = int(os.environ.get("BOT_CACHE_TTL", "300"))
+
+_MISSING = object()
+_cache = ExpiringLRUCache(maxsize=BOT_CACHE_SIZE, default_ttl=BOT_CACHE_TTL)
+# Concurrent misses for the same key (a burst of one command) load once;
+# misses for different keys load in parallel. {key: [lock, users]}
+_fills = {}
+_fills_lock = threading.Lock()
+
+
+def _page_entry(page, items_per_page):
+    counts = ban_repository.ban_counts()
+    active_count = counts['active']
+    if not active_count:
+        return (0, 1, []), counts['next_expiry']
+    total_pages = (active_count + items_per_page - 1) // items_per_page
+    page = max(1, min(page, total_pages))
+    rows = ban_repository.list_current_bans(items_per_page, (page - 1) * items_per_page)
+    return (active_count, page, rows), counts['next_expiry']
+
+
+def _stats_entry():
+    counts = ban_repository.ban_counts()
+    return (counts, ban_repository.top_staff(limit=1)), counts['next_expiry']
+
+
+def load_ban_page(page, items_per_page):
+    """(bans in force, clamped page, rows of that page) for !banlist"""
+    return _page_entry(page, items_per_page)[0]
+
+
+def load_ban_stats():
+    """(aggregate counts, top staff) for !banstats"""
+    return _stats_entry()[0]
+
+
+def _ttl(next_expiry):
+    """Seconds until the next ban in force lapses, capped at BOT_CACHE_TTL"""
+    if next_expiry is None:
+        return BOT_CACHE_TTL
+    return max(0.0, min(BOT_CACHE_TTL, (next_expiry - datetime.now()).total_seconds()))
+
+
+def _get(key, load, *args):
+    key = (ban_version.current(),) + key
+    value = _cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    with _fills_lock:
+        fill = _fills.setdefault(key, [threading.Lock(), 0])
+        fill[1] += 1
+    try:
+        with fill[0]:
+            value = _cache.get(key, _MISSING)
+            if value is _MISSING:
+                value, next_expiry = load(*args)
+                _cache.set(key, value, ttl=_ttl(next_expiry))
+    finally:
+        with _fills_lock:
+            fill[1] -= 1
+            if not fill[1]:
+                del _fills[key]
+    return value
+
+
+def ban_page(page, items_per_page):
+    """Cached load_ban_page(); needs an app context"""
+    return _get(('page', page, items_per_page), _page_entry, page, items_per_page)
+
+
+def ban_stats():
+    """Cached load_ban_stats(); needs an app context"""
+    return _get(('stats',), _stats_entry)
+
+
+def clear():
+    _cache.clear()
+
+
+def stats():
+    return _cache.stats()
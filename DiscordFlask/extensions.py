@@ -0,0 +1,15 @@
+from flask_login import LoginManager
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import DeclarativeBase
+
+# Flask extensions, created unbound so models and helpers can import them
+# without building the web app; create_app() in app.py binds them. Neither
+# opens a database connection until a query actually runs.
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+login_manager = LoginManager()
@@ -0,0 +1,43 @@
+import os
+import multiprocessing
+
+# Gunicorn settings for the web panel in production (started by serve.py:
+# gunicorn -c gunicorn.conf.py app:app). Each worker serves requests on a
+# small thread pool; the Discord bot and the ban stream run in their own
+# processes, so the workers only do web traffic.
+bind = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", "4"))
+timeout = int(os.environ.get("WEB_TIMEOUT", "30"))
+graceful_timeout = 20
+keepalive = 5
+# Recycle workers now and then so a slow leak cannot grow forever
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", "5000"))
+max_requests_jitter = 500
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("WEB_LOG_LEVEL", "info")
+
+
+def post_worker_init(worker):
+    # Every worker runs a sweeper thread; the leader lock lets one of them work
+    from app import app
+    from ban_sweeper import start_sweeper
+    start_sweeper(app)
+    # /metrics sums the snapshots all workers write to METRICS_DIR
+    import metrics
+    metrics.start_multiprocess()
+
+
+def worker_exit(server, worker):
+    # Last snapshot of a recycled worker, so child_exit folds its final counts
+    import metrics
+    metrics.flush()
+
+
+def child_exit(server, worker):
+    # Runs in the master once the worker is gone, before its pid can be reused
+    import metrics
+    metrics.retire(worker.pid)
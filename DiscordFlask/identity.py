@@ -0,0 +1,103 @@
+import os
+
+from flask_login import UserMixin
+
+from cache import ExpiringLRUCache
+
+# Resolved session identities, so Flask-Login's user_loader does not look up
+# admins.json or the staff table on every request. Entries (including "no
+# such user") live for IDENTITY_CACHE_TTL seconds; deleting a JSON admin or
+# updating/deleting a Staff row in this process invalidates the entry at
+# once, other worker processes pick the change up within the TTL.
+IDENTITY_CACHE_SIZE = int(os.environ.get("IDENTITY_CACHE_SIZE", "10000"))
+IDENTITY_CACHE_TTL = int(os.environ.get("IDENTITY_CACHE_TTL", "60"))
+
+_UNKNOWN = object()
+_cache = ExpiringLRUCache(maxsize=IDENTITY_CACHE_SIZE, default_ttl=IDENTITY_CACHE_TTL)
+
+
+class PanelUser(UserMixin):
+    """Logged-in identity for both JSON admins and Staff rows.
+
+    JSON admins use their username as id; Staff use their integer primary
+    key, which is how the ban routes tell the two apart. staff_id is the
+    Staff row recorded as banned_by (for JSON admins, the row named after
+    them, or None until their first ban creates it).
+    """
+
+    def __init__(self, id, username, is_admin, is_active=True, staff_id=None):
+        self.id = id
+        self.username = username
+        self.is_admin = is_admin
+        self._active = is_active
+        self.staff_id = staff_id
+
+    @property
+    def is_active(self):
+        return self._active
+
+    @classmethod
+    def for_admin(cls, username, staff_id=None):
+        return cls(username, username, True, staff_id=staff_id)
+
+    @classmethod
+    def for_staff(cls, staff):
+        return cls(staff.id, staff.username, bool(staff.is_admin), bool(staff.is_active), staff.id)
+
+    def __repr__(self):
+        return f'<PanelUser {self.username}>'
+
+
+def _resolve(user_id):
+    from admin_manager import get_admin
+    from sqlalchemy import select
+    from extensions import db
+    from models import Staff
+
+    # Primeiro tenta o arquivo JSON de admins, depois o banco de dados
+    if get_admin(user_id) is not None:
+        staff_id = db.session.scalar(select(Staff.id).where(Staff.username == user_id))
+        return PanelUser.for_admin(user_id, staff_id)
+    try:
+        staff = db.session.get(Staff, int(user_id))
+    except (ValueError, TypeError):
+        return None
+    if staff is None or not staff.is_active:
+        return None
+    return PanelUser.for_staff(staff)
+
+
+def load(user_id):
+    """PanelUser for a session's user id, or None (cached)"""
+    user_id = str(user_id)
+    user = _cache.get(user_id)
+    if user is None:
+        user = _resolve(user_id)
+        _cache.set(user_id, user if user is not None else _UNKNOWN)
+    return None if user is _UNKNOWN else user
+
+
+def invalidate(user_id):
+    """Forget one identity (a username or a Staff id)"""
+    _cache.delete(str(user_id))
+
+
+def clear():
+    _cache.clear()
+
+
+def stats():
+    return _cache.stats()
+
+
+def _staff_changed(mapper, connection, target):
+    # Staff ids key Staff logins, usernames the JSON admin backed by the row
+    invalidate(target.id)
+    invalidate(target.username)
+
+
+def register_staff_listeners(Staff):
+    """Drop cached identities when a Staff row is updated or deleted"""
+    from sqlalchemy import event
+    event.listen(Staff, 'after_update', _staff_changed)
+    event.listen(Staff, 'after_delete', _staff_changed)
@@ -1,7 +1,9 @@
 import threading
 import logging
-from app import app
+from app import app, init_database
 from bot import run_bot
+from ban_sweeper import start_sweeper
+from ban_stream import start_stream_server
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -15,9 +17,19 @@ def run_discord_bot():
     run_bot()
 
 if __name__ == '__main__':
+    # Development convenience: create tables and the default admin if missing
+    # (production runs this once from serve.py or `flask --app app init-db`)
+    init_database()
+    
     # Start Discord bot in a separate thread
     bot_thread = threading.Thread(target=run_discord_bot, daemon=True)
     bot_thread.start()
     
+    # Deactivate lapsed temporary bans in the background
+    start_sweeper(app)
+    
+    # Live ban change feed for the dashboard (SSE on its own asyncio server)
+    start_stream_server(app)
+    
     # Start Flask app in main thread
     run_flask()
@@ -0,0 +1,421 @@
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+import contextlib
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# In-process metrics in the Prometheus text format, served at GET /metrics by
+# the web app and by the bot's health server (BOT_HEALTH_PORT).
+#
+# Recording is a dict update under a lock; pool gauges and cache counters
+# are read only when /metrics is scraped.
+#
+# Under gunicorn every worker has its own counters. When METRICS_DIR is set
+# (serve.py does), each worker writes a snapshot there every
+# METRICS_FLUSH_INTERVAL seconds and /metrics serves the sum over all
+# workers. When a worker exits, the gunicorn master folds its counters into
+# EXITED_FILE and deletes its snapshot (retire()), so recycled workers
+# neither pile up files nor lose counts to a reused pid; gauges of exited
+# workers are dropped.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+# When set, /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+EXITED_FILE = 'exited.json'
+
+
+class _Family:
+    """One metric name with labelled samples"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'type': self.kind,
+                'help': self.help,
+                'labels': self.labelnames,
+                'samples': {json.dumps(key): self._copy(value) for key, value in self._samples.items()},
+            }
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(_Family):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._samples[labels] = self._samples.get(labels, 0) + amount
+
+
+class Histogram(_Family):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._samples.get(labels)
+            if sample is None:
+                # Per-bucket counts (last one is +Inf), sum, count
+                sample = self._samples[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    def snapshot(self):
+        data = super().snapshot()
+        data['buckets'] = self.buckets
+        return data
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+
+http_requests = Counter('banpanel_http_requests_total',
+                        'HTTP requests by route, method and status',
+                        ('endpoint', 'method', 'status'))
+http_latency = Histogram('banpanel_http_request_duration_seconds',
+                         'HTTP request latency by route', ('endpoint', 'method'))
+http_queries = Histogram('banpanel_http_request_queries',
+                         'SQL statements executed per HTTP request', ('endpoint',),
+                         buckets=QUERY_BUCKETS)
+bot_commands = Counter('banpanel_bot_commands_total',
+                       'Discord bot commands by outcome (ok, user_error, error)',
+                       ('command', 'status'))
+bot_latency = Histogram('banpanel_bot_command_duration_seconds',
+                        'Discord bot command latency', ('command',))
+bot_db_calls = Counter('banpanel_bot_db_calls_total',
+                       'Database calls of the bot by outcome (ok, error, timeout)', ('status',))
+bot_db_latency = Histogram('banpanel_bot_db_call_duration_seconds',
+                           'Latency of the bot database calls')
+db_statements = Counter('banpanel_db_statements_total',
+                        'SQL statements sent to the database by this process')
+db_slow_statements = Counter('banpanel_db_slow_statements_total',
+                             'SQL statements slower than SLOW_QUERY_MS (see profiling.py)')
+
+_FAMILIES = (http_requests, http_latency, http_queries, bot_commands, bot_latency,
+             bot_db_calls, bot_db_latency, db_statements, db_slow_statements)
+
+_local = threading.local()
+_app = None
+_multiprocess = False
+_listeners_installed = False
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    db_statements.inc()
+    count = getattr(_local, 'queries', None)
+    if count is not None:
+        _local.queries = count + 1
+
+
+def _before_request():
+    from flask import request
+    _local.queries = 0
+    request.environ['banpanel.started'] = time.perf_counter()
+
+
+def _after_request(response):
+    from flask import request
+    started = request.environ.get('banpanel.started')
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        http_requests.inc(endpoint, request.method, str(response.status_code))
+        http_latency.observe(time.perf_counter() - started, endpoint, request.method)
+        http_queries.observe(getattr(_local, 'queries', 0) or 0, endpoint)
+    _local.queries = None
+    return response
+
+
+def init_app(app):
+    """Record request metrics for app (no-op when METRICS_ENABLED=0)"""
+    global _app, _listeners_installed
+    if not METRICS_ENABLED:
+        return
+    _app = app
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    if not _listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _count_statement)
+        _listeners_installed = True
+
+
+def observe_bot_command(ctx, status):
+    """Count a finished bot command; its latency is known if it got invoked"""
+    if not METRICS_ENABLED or ctx.command is None:
+        return
+    name = ctx.command.qualified_name
+    bot_commands.inc(name, status)
+    started = getattr(ctx, 'metrics_started', None)
+    if started is not None:
+        bot_latency.observe(time.perf_counter() - started, name)
+
+
+def observe_bot_db_call(seconds, status):
+    if METRICS_ENABLED:
+        bot_db_calls.inc(status)
+        bot_db_latency.observe(seconds)
+
+
+def _gauge(name, help_text, labelnames, samples, kind='gauge'):
+    return name, {
+        'type': kind,
+        'help': help_text,
+        'labels': tuple(labelnames),
+        'samples': {json.dumps(key): value for key, value in samples.items()},
+    }
+
+
+def _collect_pool():
+    if _app is None:
+        return []
+    from extensions import db
+    with _app.app_context():
+        pool = db.engine.pool
+    if not hasattr(pool, 'checkedout'):
+        return []
+    return [
+        _gauge('banpanel_db_pool_size', 'Configured size of the connection pool', (), {(): pool.size()}),
+        _gauge('banpanel_db_pool_checked_out', 'Connections currently checked out of the pool',
+               (), {(): pool.checkedout()}),
+        # Negative while the pool has not opened all of its pool_size connections
+        _gauge('banpanel_db_pool_overflow', 'Connections open beyond pool_size', (), {(): pool.overflow()}),
+    ]
+
+
+def _collect_caches():
+    import ban_cache
+    import bot_cache
+    import identity
+    stats = {'ban_check': ban_cache.stats(), 'identity': identity.stats(), 'bot': bot_cache.stats()}
+    return [
+        _gauge('banpanel_cache_hits_total', 'Cache lookups answered from the cache', ('cache',),
+               {(name,): s['hits'] for name, s in stats.items()}, kind='counter'),
+        _gauge('banpanel_cache_misses_total', 'Cache lookups that went to the database', ('cache',),
+               {(name,): s['misses'] for name, s in stats.items()}, kind='counter'),
+        _gauge('banpanel_cache_entries', 'Entries held by the cache', ('cache',),
+               {(name,): s['size'] for name, s in stats.items()}),
+    ]
+
+
+def collect():
+    """{metric name: family data} of this process"""
+    families = {family.name: family.snapshot() for family in _FAMILIES}
+    for collector in (_collect_pool, _collect_caches):
+        try:
+            families.update(collector())
+        except Exception as e:
+            logging.error(f"Error collecting metrics: {e}")
+    return families
+
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+@contextlib.contextmanager
+def _directory_lock(exclusive):
+    """Readers share METRICS_DIR; retire() holds it alone while it moves counts"""
+    import fcntl
+    with open(os.path.join(METRICS_DIR, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path, families):
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump(families, f)
+    os.replace(temporary, path)
+
+
+def flush():
+    """Write this process's snapshot to METRICS_DIR (multi-process mode)"""
+    if not _multiprocess:
+        return
+    _write_snapshot(_snapshot_path(os.getpid()), collect())
+
+
+def retire(pid):
+    """Fold the counters of exited worker pid into EXITED_FILE and drop its snapshot.
+
+    Called by the gunicorn master (child_exit) after the worker is gone.
+    """
+    if not METRICS_ENABLED or not METRICS_DIR:
+        return
+    path = _snapshot_path(pid)
+    if not os.path.exists(path):
+        return
+    exited_path = os.path.join(METRICS_DIR, EXITED_FILE)
+    with _directory_lock(exclusive=True):
+        families = _read_snapshot(path)
+        if families is not None:
+            total = _read_snapshot(exited_path) or {}
+            _merge(total, families, include_gauges=False)
+            _write_snapshot(exited_path, total)
+        os.remove(path)
+
+
+def _flush_forever():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logging.error(f"Error writing metrics snapshot: {e}")
+
+
+def start_multiprocess():
+    """Share this worker's metrics through METRICS_DIR (call once per worker)"""
+    global _multiprocess
+    if not METRICS_ENABLED or not METRICS_DIR or _multiprocess:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _multiprocess = True
+    flush()
+    threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True).start()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(total, families, include_gauges):
+    for name, family in families.items():
+        if family['type'] == 'gauge' and not include_gauges:
+            continue
+        merged = total.setdefault(name, dict(family, samples={}))
+        for key, value in family['samples'].items():
+            current = merged['samples'].get(key)
+            if current is None:
+                merged['samples'][key] = value
+            elif family['type'] == 'histogram':
+                merged['samples'][key] = [[a + b for a, b in zip(current[0], value[0])],
+                                          current[1] + value[1], current[2] + value[2]]
+            else:
+                merged['samples'][key] = current + value
+
+
+def _gather():
+    if not _multiprocess:
+        return collect()
+    flush()
+    total = {}
+    with _directory_lock(exclusive=False):
+        for filename in sorted(os.listdir(METRICS_DIR)):
+            if not filename.endswith('.json'):
+                continue
+            families = _read_snapshot(os.path.join(METRICS_DIR, filename))
+            if families is None:
+                continue
+            if filename == EXITED_FILE:
+                _merge(total, families, include_gauges=False)
+            else:
+                _merge(total, families, include_gauges=_alive(int(filename[:-5])))
+    return total
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _hit_ratios(families):
+    """Derive banpanel_cache_hit_ratio from the (summed) hit and miss counters"""
+    hits = families.get('banpanel_cache_hits_total')
+    misses = families.get('banpanel_cache_misses_total')
+    if not hits or not misses:
+        return
+    samples = {}
+    for key, hit_count in hits['samples'].items():
+        lookups = hit_count + misses['samples'].get(key, 0)
+        samples[key] = hit_count / lookups if lookups else 0.0
+    families['banpanel_cache_hit_ratio'] = {
+        'type': 'gauge',
+        'help': 'Share of cache lookups answered from the cache',
+        'labels': hits['labels'],
+        'samples': samples,
+    }
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    families = _gather()
+    _hit_ratios(families)
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        labelnames = family['labels']
+        for key, value in sorted(family['samples'].items()):
+            labels = json.loads(key)
+            if family['type'] == 'histogram':
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(family['buckets']) + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_labels(labelnames, labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labelnames, labels)} {_format_number(total)}")
+                lines.append(f"{name}_count{_labels(labelnames, labels)} {count}")
+            else:
+                lines.append(f"{name}{_labels(labelnames, labels)} {_format_number(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def authorized(header):
+    """True if an Authorization header satisfies METRICS_TOKEN (or none is set)"""
+    return not METRICS_TOKEN or header == f"Bearer {METRICS_TOKEN}"
@@ -1,9 +1,13 @@
+import logging
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy import and_, func, inspect, or_, select, text, update
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.schema import CreateIndex
 from werkzeug.security import generate_password_hash, check_password_hash
 
-# Import db from app - this will be resolved when app imports this module
-from app import db
+# Unbound SQLAlchemy instance, configured by create_app() in app.py
+from extensions import db
 
 
 class Staff(UserMixin, db.Model):
@@ -51,6 +55,21 @@ class GameBan(db.Model):
     # Foreign key to staff member who created the ban
     banned_by_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
     
+    # Indexes backing the keyset-paginated, filtered listing of /api/bans
+    __table_args__ = (
+        db.Index('ix_game_bans_player_active_expires', 'player_id', 'is_active', 'expires_at'),
+        db.Index('ix_game_bans_active_created', 'is_active', 'created_at', 'id'),
+        db.Index('ix_game_bans_active_type_created', 'is_active', 'ban_type', 'created_at'),
+        db.Index('ix_game_bans_active_expires', 'is_active', 'expires_at'),
+        db.Index('ix_game_bans_staff_created', 'banned_by_id', 'created_at'),
+        # Incremental readers (ban snapshot) scan rows changed since a timestamp
+        db.Index('ix_game_bans_updated_id', 'updated_at', 'id'),
+        # One active ban per player; ban creation inserts with ON CONFLICT
+        # against it instead of checking first (see ban_import.py)
+        db.Index('uq_game_bans_player_active', 'player_id', unique=True,
+                 postgresql_where=text('is_active'), sqlite_where=text('is_active')),
+    )
+    
     def is_expired(self):
         """Check if temporary ban has expired"""
         if self.ban_type == 'temporary' and self.expires_at:
@@ -63,5 +82,142 @@ class GameBan(db.Model):
             return self.expires_at - datetime.now()
         return None
     
+    @hybrid_property
+    def expired(self):
+        """is_expired() usable in queries, e.g. filter(GameBan.expired)"""
+        return self.is_expired()
+    
+    @expired.expression
+    def expired(cls):
+        return and_(cls.ban_type == 'temporary',
+                    cls.expires_at.isnot(None),
+                    cls.expires_at < datetime.now())
+    
+    @hybrid_property
+    def currently_banned(self):
+        """Active and not expired; usable in queries as a WHERE clause"""
+        return bool(self.is_active) and not self.is_expired()
+    
+    @currently_banned.expression
+    def currently_banned(cls):
+        return and_(cls.is_active == True,
+                    or_(cls.expires_at.is_(None),
+                        cls.expires_at >= datetime.now(),
+                        cls.ban_type != 'temporary'))
+    
     def __repr__(self):
-        return f'<GameBan {self.player_id}: {self.reason[:50]}>'
\ No newline at end of file
+        return f'<GameBan {self.player_id}: {self.reason[:50]}>'
+
+
+
+class AdminLog(db.Model):
+    """Append-only audit log of administrative actions"""
+    __tablename__ = 'admin_logs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
+    action = db.Column(db.String(100), nullable=False, index=True)
+    target = db.Column(db.String(200), nullable=True)
+    author = db.Column(db.String(100), nullable=True, index=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'timestamp': self.timestamp.isoformat(),
+            'action': self.action,
+            'target': self.target,
+            'author': self.author
+        }
+    
+    def __repr__(self):
+        return f'<AdminLog {self.action} {self.target} by {self.author}>'
+
+
+
+class BanSearchNgram(db.Model):
+    """Trigrams of player IDs/names, the search index where pg_trgm is unavailable"""
+    __tablename__ = 'ban_search_ngrams'
+    
+    gram = db.Column(db.String(16), primary_key=True)
+    ban_id = db.Column(db.Integer, db.ForeignKey('game_bans.id', ondelete='CASCADE'),
+                       primary_key=True, index=True)
+
+
+class BanSetVersion(db.Model):
+    """Single-row counter bumped in every transaction that changes the ban set"""
+    __tablename__ = 'ban_set_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+# Drop cached session identities when a staff member changes
+from identity import register_staff_listeners
+register_staff_listeners(Staff)
+
+# Keep ban_search_ngrams in sync with ORM writes to game_bans
+from ban_search import register_index_listeners
+register_index_listeners(GameBan)
+
+def deactivate_duplicate_bans(engine):
+    """Keep only the newest active ban of each player.
+
+    Older tables may hold several active bans for one player (the check
+    before insert was racy); they must be resolved before
+    uq_game_bans_player_active can be built.
+    """
+    table = GameBan.__table__
+    newest = (select(func.max(table.c.id))
+              .where(table.c.is_active == True)
+              .group_by(table.c.player_id))
+    with engine.begin() as conn:
+        result = conn.execute(
+            update(table)
+            .where(table.c.is_active == True, table.c.id.not_in(newest))
+            .values(is_active=False, updated_at=datetime.now())
+        )
+    if result.rowcount:
+        logging.warning(f"Deactivated {result.rowcount} duplicate active bans")
+
+def ensure_indexes():
+    """Create any declared index that is missing from an existing table.
+
+    On PostgreSQL the indexes are built with CREATE INDEX CONCURRENTLY so a
+    live game_bans table keeps accepting writes while they are created. A
+    build that failed (deadlock, cancel, duplicates for a unique index)
+    leaves an INVALID index under the name; it is dropped and rebuilt. Runs
+    from the one-time setup, so no other process is building indexes.
+    """
+    engine = db.engine
+    tables = (Staff.__table__, GameBan.__table__, AdminLog.__table__)
+    
+    if engine.dialect.name != 'postgresql':
+        existing = {index['name'] for index in inspect(engine).get_indexes(GameBan.__tablename__)}
+        if 'uq_game_bans_player_active' not in existing:
+            deactivate_duplicate_bans(engine)
+        for table in tables:
+            for index in table.indexes:
+                index.create(engine, checkfirst=True)
+        return
+    
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        valid = dict(conn.execute(text(
+            "SELECT c.relname, i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = current_schema()")).all())
+        if not valid.get('uq_game_bans_player_active'):
+            deactivate_duplicate_bans(engine)
+        for table in tables:
+            for index in table.indexes:
+                if valid.get(index.name):
+                    continue
+                if index.name in valid:
+                    logging.warning(f"Rebuilding invalid index {index.name}")
+                    name = engine.dialect.identifier_preparer.quote(index.name)
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+                ddl = ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+                ddl = ddl.replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1)
+                conn.execute(text(ddl))
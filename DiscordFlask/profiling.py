@@ -0,0 +1,215 @@
+import os
+import io
+import time
+import pstats
+import random
+import cProfile
+import logging
+import threading
+import contextvars
+import tracemalloc
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metrics
+
+# Diagnostics for slow pages: a slow-statement log and a sampled profiler.
+#
+# Every SQL statement is timed by engine events; those taking SLOW_QUERY_MS
+# or longer are logged with what issued them (HTTP route, bot command or
+# thread name). SLOW_QUERY_MS=0 turns the log off.
+#
+# PROFILE_SAMPLE_RATE (0..1, default 0 = off) profiles that share of web
+# requests with cProfile, one request per process at a time. Each sampled
+# request slower than PROFILE_MIN_MS leaves two files in PROFILE_DIR:
+#   <stamp>-<pid>-<route>.prof  pstats data (python -m pstats, snakeviz)
+#   <stamp>-<pid>-<route>.txt   top functions by cumulative time and, with
+#                               PROFILE_TRACEMALLOC=1, the biggest memory
+#                               growth during the request (all threads)
+# Only the newest PROFILE_KEEP profiles are kept.
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "500"))
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MIN_MS = float(os.environ.get("PROFILE_MIN_MS", "0"))
+PROFILE_TRACEMALLOC = os.environ.get("PROFILE_TRACEMALLOC", "0") == "1"
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "200"))
+# Rows of the text summaries
+PROFILE_TOP = 40
+SLOW_QUERY_MAX_CHARS = 1000
+
+_origin = contextvars.ContextVar('banpanel_origin', default=None)
+_profile_slot = threading.Lock()
+_listeners_installed = False
+
+
+def current_origin():
+    """What the current code runs for: 'GET /api/bans', '!banlist', or the thread name"""
+    return _origin.get() or threading.current_thread().name
+
+
+def set_origin(origin):
+    """Label the statements of the current context; returns a reset token"""
+    return _origin.set(origin)
+
+
+def run_with_origin(origin, func, *args):
+    """Call func with origin set, e.g. in an executor thread"""
+    token = _origin.set(origin)
+    try:
+        return func(*args)
+    finally:
+        _origin.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('banpanel_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['banpanel_query_started'].pop()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms >= SLOW_QUERY_MS:
+        metrics.db_slow_statements.inc()
+        statement = ' '.join(statement.split())
+        if len(statement) > SLOW_QUERY_MAX_CHARS:
+            statement = statement[:SLOW_QUERY_MAX_CHARS] + '...'
+        rows = f", {cursor.rowcount} rows" if not executemany and cursor.rowcount >= 0 else ''
+        logging.warning(f"Slow query ({elapsed_ms:.0f} ms{rows}) in {current_origin()}: {statement}")
+
+
+def _handle_error(exception_context):
+    # The statement failed: drop its start time so the stack stays aligned
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('banpanel_query_started'):
+        connection.info['banpanel_query_started'].pop()
+
+
+def install_slow_query_log():
+    """Time every statement of every engine in this process (once)"""
+    global _listeners_installed
+    if _listeners_installed or SLOW_QUERY_MS <= 0:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    _listeners_installed = True
+
+
+class RequestProfile:
+    """cProfile (and optionally tracemalloc) around one request"""
+
+    _tracemalloc_users = 0
+    _tracemalloc_lock = threading.Lock()
+
+    def __init__(self, label):
+        self.label = label
+        self.profiler = cProfile.Profile()
+        self.memory_before = None
+        self.started = None
+
+    def start(self):
+        if PROFILE_TRACEMALLOC:
+            with RequestProfile._tracemalloc_lock:
+                if RequestProfile._tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start(10)
+                RequestProfile._tracemalloc_users += 1
+            self.memory_before = tracemalloc.take_snapshot()
+        self.started = time.perf_counter()
+        self.profiler.enable()
+
+    def stop(self):
+        """Stop profiling; returns the request duration in ms"""
+        self.profiler.disable()
+        elapsed_ms = (time.perf_counter() - self.started) * 1000
+        self.memory_after = None
+        if self.memory_before is not None:
+            self.memory_after = tracemalloc.take_snapshot()
+            with RequestProfile._tracemalloc_lock:
+                RequestProfile._tracemalloc_users -= 1
+                if RequestProfile._tracemalloc_users == 0:
+                    tracemalloc.stop()
+        return elapsed_ms
+
+    def dump(self, elapsed_ms, status):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = ''.join(ch if ch.isalnum() else '_' for ch in self.label).strip('_')[:80]
+        base = os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}-{slug}")
+        self.profiler.dump_stats(base + '.prof')
+
+        summary = io.StringIO()
+        summary.write(f"{self.label} -> {status} in {elapsed_ms:.1f} ms\n\n")
+        stats = pstats.Stats(self.profiler, stream=summary)
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+        if self.memory_after is not None:
+            summary.write("\nMemory growth during the request (all threads):\n")
+            for stat in self.memory_after.compare_to(self.memory_before, 'lineno')[:PROFILE_TOP]:
+                summary.write(f"{stat}\n")
+        with open(base + '.txt', 'w') as f:
+            f.write(summary.getvalue())
+        _prune()
+        return base
+
+
+def _prune():
+    """Keep the newest PROFILE_KEEP profiles"""
+    profiles = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith('.prof'))
+    for name in profiles[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        for extension in ('.prof', '.txt'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name[:-5] + extension))
+            except FileNotFoundError:
+                pass
+
+
+def _request_label(request):
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    return f"{request.method} {rule}"
+
+
+def _before_request():
+    from flask import g, request
+    label = _request_label(request)
+    g.banpanel_origin_token = _origin.set(label)
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        # One profiled request per process at a time; others are skipped
+        if _profile_slot.acquire(blocking=False):
+            g.banpanel_profile = RequestProfile(label)
+            g.banpanel_profile.start()
+
+
+def _after_request(response):
+    from flask import g
+    profile = g.pop('banpanel_profile', None)
+    if profile is not None:
+        try:
+            elapsed_ms = profile.stop()
+            if elapsed_ms >= PROFILE_MIN_MS:
+                path = profile.dump(elapsed_ms, response.status_code)
+                logging.info(f"Profiled {profile.label} ({elapsed_ms:.0f} ms): {path}.txt")
+        except Exception as e:
+            logging.error(f"Error writing request profile: {e}")
+        finally:
+            _profile_slot.release()
+    return response
+
+
+def _teardown_request(exc):
+    from flask import g
+    # A request that failed before after_request still holds the slot
+    profile = g.pop('banpanel_profile', None)
+    if profile is not None:
+        profile.stop()
+        _profile_slot.release()
+    token = g.pop('banpanel_origin_token', None)
+    if token is not None:
+        _origin.reset(token)
+
+
+def init_app(app):
+    """Slow-query log plus request labels and sampling for app"""
+    install_slow_query_log()
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
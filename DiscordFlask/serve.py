@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+import signal
+import logging
+import subprocess
+import tempfile
+
+# Production launcher. Runs the one-time database setup, then supervises:
+#   web     gunicorn workers serving app:app (gunicorn.conf.py), /healthz and
+#           /metrics on WEB_BIND
+#   bot     the Discord bot (bot.py), /healthz and /metrics on BOT_HEALTH_PORT
+#   stream  the SSE ban stream (ban_stream.py), /healthz on BAN_STREAM_PORT
+# The bot and stream are restarted with exponential backoff when they die;
+# if gunicorn itself exits, everything is shut down so the platform restarts
+# the whole service. main.py remains the single-process development mode.
+RESTART_BACKOFF_MAX = 60
+# A child that stayed up this long gets its backoff reset
+RESTART_BACKOFF_RESET = 60
+SHUTDOWN_TIMEOUT = 20
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+COMMANDS = {
+    'web': [sys.executable, '-m', 'gunicorn', '-c', os.path.join(HERE, 'gunicorn.conf.py'), 'app:app'],
+    'bot': [sys.executable, os.path.join(HERE, 'bot.py')],
+    'stream': [sys.executable, os.path.join(HERE, 'ban_stream.py')],
+}
+
+
+class Child:
+    """One supervised process"""
+
+    def __init__(self, name, command, env):
+        self.name = name
+        self.command = command
+        self.env = env
+        self.process = None
+        self.started_at = 0.0
+        self.backoff = 1
+        self.restart_at = 0.0
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, cwd=HERE, env=self.env)
+        self.started_at = time.monotonic()
+        logging.info(f"Started {self.name} (pid {self.process.pid})")
+
+    def exited(self):
+        return self.process is not None and self.process.poll() is not None
+
+    def schedule_restart(self):
+        if time.monotonic() - self.started_at >= RESTART_BACKOFF_RESET:
+            self.backoff = 1
+        self.restart_at = time.monotonic() + self.backoff
+        logging.warning(f"{self.name} exited with code {self.process.returncode}, "
+                        f"restarting in {self.backoff}s")
+        self.backoff = min(self.backoff * 2, RESTART_BACKOFF_MAX)
+        self.process = None
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def wait(self, deadline):
+        if self.process is None:
+            return
+        try:
+            self.process.wait(timeout=max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            logging.warning(f"{self.name} did not stop in time, killing it")
+            self.process.kill()
+            self.process.wait()
+
+
+def init_database():
+    """Create tables and seed data once, before any worker starts"""
+    from app import init_database as run_init, db, app
+    run_init()
+    with app.app_context():
+        db.engine.dispose()
+
+
+def supervise(names):
+    children = [Child(name, COMMANDS[name], dict(os.environ)) for name in names]
+    stopping = []
+
+    def request_stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    for child in children:
+        child.start()
+
+    exit_code = 0
+    while not stopping:
+        time.sleep(1)
+        for child in children:
+            if child.process is None:
+                if time.monotonic() >= child.restart_at:
+                    child.start()
+            elif child.exited():
+                if child.name == 'web':
+                    logging.error(f"web exited with code {child.process.returncode}, shutting down")
+                    exit_code = child.process.returncode or 1
+                    stopping.append(None)
+                    break
+                if child.process.returncode == 0:
+                    # Clean exit (e.g. the bot has no token): do not respawn
+                    logging.info(f"{child.name} exited cleanly, not restarting")
+                    child.process = None
+                    child.restart_at = float('inf')
+                    continue
+                child.schedule_restart()
+
+    for child in children:
+        child.stop()
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    for child in children:
+        child.wait(deadline)
+    return exit_code
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [serve] %(levelname)s %(message)s')
+    # SERVE_PROCESSES=web,stream runs a subset (e.g. the bot on another machine)
+    names = [name.strip() for name in os.environ.get("SERVE_PROCESSES", "web,bot,stream").split(',') if name.strip()]
+    init_database()
+    # Gunicorn workers merge their /metrics through this directory; start
+    # from an empty one so counters of a previous run are not added in
+    metrics_dir = os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp(prefix='banpanel-metrics-'))
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        if name.endswith('.json'):
+            os.remove(os.path.join(metrics_dir, name))
+    sys.exit(supervise(names))
@@ -1,9 +1,32 @@
 // Main JavaScript for Game Ban Manager
 
 /**
- * Refresh the bans table
+ * Fetch one page of the ban table (rows as HTML plus the next cursor)
  */
-function refreshBans() {
+function fetchBansTable(cursor = null) {
+    const params = new URLSearchParams();
+    if (cursor) {
+        params.append('cursor', cursor);
+    }
+    return GameBanAPI.getJSON(`${GameBanAPI.baseUrl}/bans/table?${params}`);
+}
+
+/**
+ * Show the "load more" button only while another page exists
+ */
+function setNextCursor(cursor) {
+    const container = document.getElementById('loadMoreBans');
+    if (!container) {
+        return;
+    }
+    container.querySelector('button').dataset.nextCursor = cursor || '';
+    container.style.display = cursor ? '' : 'none';
+}
+
+/**
+ * Refresh the bans table in place (first page and counters)
+ */
+async function refreshBans() {
     const refreshButton = document.querySelector('button[onclick="refreshBans()"]');
     const originalContent = refreshButton.innerHTML;
     
@@ -11,10 +34,64 @@ function refreshBans() {
     refreshButton.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i>Atualizando...';
     refreshButton.disabled = true;
     
-    // Reload the page to refresh data
-    setTimeout(() => {
-        window.location.reload();
-    }, 500);
+    try {
+        const page = await fetchBansTable();
+        if (!page.success) {
+            showToast(`Erro ao atualizar: ${page.error}`, 'error');
+            return;
+        }
+        
+        const tbody = document.getElementById('bansTableBody');
+        tbody.innerHTML = page.html;
+        bindCopyHandlers(tbody);
+        setNextCursor(page.next_cursor);
+        
+        document.getElementById('bansTable').style.display = page.count ? '' : 'none';
+        document.getElementById('bansEmpty').style.display = page.count ? 'none' : '';
+        document.getElementById('totalBansCount').textContent = page.total_bans;
+        document.getElementById('activeBansCount').textContent = page.active_bans;
+        document.getElementById('activeBansCount').dataset.countedAt = page.counted_at;
+    } catch (error) {
+        showToast('Erro ao atualizar bans', 'error');
+    } finally {
+        refreshButton.innerHTML = originalContent;
+        refreshButton.disabled = false;
+    }
+}
+
+/**
+ * Append the next page of bans to the table
+ */
+async function loadMoreBans() {
+    const button = document.querySelector('#loadMoreBans button');
+    const cursor = button.dataset.nextCursor;
+    if (!cursor) {
+        return;
+    }
+    
+    const originalContent = button.innerHTML;
+    button.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i>Carregando...';
+    button.disabled = true;
+    
+    try {
+        const page = await fetchBansTable(cursor);
+        if (!page.success) {
+            showToast(`Erro ao carregar bans: ${page.error}`, 'error');
+            return;
+        }
+        
+        const tbody = document.getElementById('bansTableBody');
+        const rows = document.createElement('tbody');
+        rows.innerHTML = page.html;
+        bindCopyHandlers(rows);
+        tbody.append(...rows.children);
+        setNextCursor(page.next_cursor);
+    } catch (error) {
+        showToast('Erro ao carregar bans', 'error');
+    } finally {
+        button.innerHTML = originalContent;
+        button.disabled = false;
+    }
 }
 
 /**
@@ -91,11 +168,92 @@ function formatTimeRemaining(timeString) {
 }
 
 /**
- * Add click-to-copy functionality and form validation
+ * Add to the dashboard counters; "active" only changes for bans in force
  */
-document.addEventListener('DOMContentLoaded', function() {
+function adjustBanCounters(delta, inForce = true) {
+    const ids = inForce ? ['totalBansCount', 'activeBansCount'] : ['totalBansCount'];
+    ids.forEach(id => {
+        const element = document.getElementById(id);
+        if (element) {
+            element.textContent = Math.max(0, parseInt(element.textContent, 10) + delta);
+        }
+    });
+}
+
+/**
+ * Whether the "active" counter still counted a lifted or expired ban:
+ * bans that had lapsed when the counters were computed were left out
+ */
+function wasCountedActive(change) {
+    const counter = document.getElementById('activeBansCount');
+    if (!change.expires_at || !counter || !counter.dataset.countedAt) {
+        return true;
+    }
+    // Both timestamps come from the server clock, so they compare directly
+    return new Date(change.expires_at) > new Date(counter.dataset.countedAt);
+}
+
+/**
+ * Apply one ban change event to the table without reloading it
+ */
+async function applyBanEvent(change) {
+    const tbody = document.getElementById('bansTableBody');
+    
+    if (change.event === 'resync') {
+        // Events were missed (reconnect or slow client): reload the first page
+        refreshBans();
+        return;
+    }
+    
+    const existing = tbody.querySelector(`tr[data-ban-id="${change.id}"]`);
+    
+    if (change.event === 'created') {
+        if (existing) {
+            return;
+        }
+        const response = await fetch(`${GameBanAPI.baseUrl}/bans/row/${change.id}`);
+        if (!response.ok) {
+            return;
+        }
+        const rows = document.createElement('tbody');
+        rows.innerHTML = await response.text();
+        bindCopyHandlers(rows);
+        tbody.prepend(...rows.children);
+        adjustBanCounters(1);
+        document.getElementById('bansTable').style.display = '';
+        document.getElementById('bansEmpty').style.display = 'none';
+    } else if (change.event === 'removed' || change.event === 'expired') {
+        adjustBanCounters(-1, wasCountedActive(change));
+        if (existing) {
+            existing.remove();
+        }
+    }
+}
+
+/**
+ * Subscribe the dashboard to the server-sent ban change stream
+ */
+function subscribeBanStream() {
+    const tbody = document.getElementById('bansTableBody');
+    if (!tbody || !tbody.dataset.streamUrl || !window.EventSource) {
+        return null;
+    }
+    
+    const source = new EventSource(tbody.dataset.streamUrl, { withCredentials: true });
+    source.addEventListener('ban', event => {
+        applyBanEvent(JSON.parse(event.data)).catch(error => {
+            console.error('Error applying ban event:', error);
+        });
+    });
+    return source;
+}
+
+/**
+ * Add click-to-copy to the player IDs under root
+ */
+function bindCopyHandlers(root) {
     // Make player IDs clickable to copy
-    document.querySelectorAll('code').forEach(code => {
+    root.querySelectorAll('code').forEach(code => {
         if (code.textContent.trim()) {
             code.style.cursor = 'pointer';
             code.title = 'Clique para copiar';
@@ -104,6 +262,13 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         }
     });
+}
+
+/**
+ * Add click-to-copy functionality and form validation
+ */
+document.addEventListener('DOMContentLoaded', function() {
+    bindCopyHandlers(document);
     
     // Form validation for player ID
     const playerIdInput = document.getElementById('player_id');
@@ -151,6 +316,9 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Update time remaining for temporary bans every minute
     setInterval(updateTimeRemaining, 60000);
+    
+    // Patch the ban table live as bans are created, removed or expire
+    subscribeBanStream();
 });
 
 /**
@@ -179,32 +347,122 @@ function updateTimeRemaining() {
 const GameBanAPI = {
     baseUrl: window.location.origin,
     
+    // Last ETag and body per URL, for conditional GETs
+    _etagCache: new Map(),
+    
     /**
-     * Get all bans
+     * GET a JSON endpoint, sending If-None-Match when we already have a copy;
+     * a 304 reuses the cached body without downloading it again
      */
-    async getAllBans() {
+    async getJSON(url) {
+        const cached = this._etagCache.get(url);
+        const headers = {};
+        if (cached) {
+            headers['If-None-Match'] = cached.etag;
+        }
+        
+        const response = await fetch(url, { headers: headers, cache: 'no-store' });
+        if (response.status === 304 && cached) {
+            return cached.data;
+        }
+        
+        const data = await response.json();
+        const etag = response.headers.get('ETag');
+        if (response.ok && etag) {
+            this._etagCache.set(url, { etag: etag, data: data });
+        } else {
+            this._etagCache.delete(url);
+        }
+        return data;
+    },
+    
+    /**
+     * Get one page of bans (filters: limit, cursor, order, ban_type,
+     * expired, banned_by, created_after, created_before)
+     */
+    async getBansPage(filters = {}) {
         try {
-            const response = await fetch(`${this.baseUrl}/api/bans`);
-            return await response.json();
+            const params = new URLSearchParams();
+            Object.entries(filters).forEach(([key, value]) => {
+                if (value !== null && value !== undefined && value !== '') {
+                    params.append(key, value);
+                }
+            });
+            return await this.getJSON(`${this.baseUrl}/api/bans?${params}`);
         } catch (error) {
             console.error('Error fetching bans:', error);
             throw error;
         }
     },
     
+    /**
+     * Get all bans, following the pagination cursor page by page
+     */
+    async getAllBans(filters = {}) {
+        const bans = [];
+        let cursor = null;
+        
+        do {
+            const page = await this.getBansPage({ ...filters, cursor: cursor });
+            if (!page.success) {
+                return page;
+            }
+            bans.push(...page.bans);
+            cursor = page.next_cursor;
+        } while (cursor);
+        
+        return {
+            success: true,
+            bans: bans,
+            total: bans.length
+        };
+    },
+    
     /**
      * Check if player is banned
      */
     async checkBan(playerId) {
         try {
-            const response = await fetch(`${this.baseUrl}/api/bans/check/${encodeURIComponent(playerId)}`);
-            return await response.json();
+            return await this.getJSON(`${this.baseUrl}/api/bans/check/${encodeURIComponent(playerId)}`);
         } catch (error) {
             console.error('Error checking ban:', error);
             throw error;
         }
     },
     
+    /**
+     * Check many players at once (e.g. a whole lobby)
+     */
+    async checkBans(playerIds) {
+        try {
+            const response = await fetch(`${this.baseUrl}/api/bans/check`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ player_ids: playerIds })
+            });
+            return await response.json();
+        } catch (error) {
+            console.error('Error checking bans:', error);
+            throw error;
+        }
+    },
+    
+    /**
+     * Search active bans by player ID or name (ranked, case-insensitive)
+     */
+    async searchBans(query, limit = 10) {
+        try {
+            const params = new URLSearchParams({ q: query, limit: limit });
+            const response = await fetch(`${this.baseUrl}/api/bans/search?${params}`);
+            return await response.json();
+        } catch (error) {
+            console.error('Error searching bans:', error);
+            throw error;
+        }
+    },
+    
     /**
      * Add a new ban
      */
@@ -255,7 +513,7 @@ const GameBanAPI = {
 window.GameBanAPI = GameBanAPI;
 
 /**
- * Advanced search functionality
+ * Advanced search functionality (ranked search by ID or name)
  */
 async function searchPlayer() {
     const searchInput = document.getElementById('search_player');
@@ -270,45 +528,49 @@ async function searchPlayer() {
     searchResult.innerHTML = '<div class="text-center"><i class="fas fa-spinner fa-spin"></i> Buscando...</div>';
     
     try {
-        const response = await GameBanAPI.checkBan(searchTerm);
+        const response = await GameBanAPI.searchBans(searchTerm);
         
         if (response.success) {
-            if (response.is_banned) {
-                const ban = response.ban_info;
-                let statusBadge = ban.ban_type === 'permanent' ? 
-                    '<span class="badge bg-danger">Permanente</span>' : 
-                    '<span class="badge bg-warning">Temporário</span>';
-                
-                let expirationInfo = '';
-                if (ban.expires_at) {
-                    const expiresAt = new Date(ban.expires_at);
-                    expirationInfo = `<br><strong>Expira:</strong> ${expiresAt.toLocaleString('pt-BR')}`;
+            if (response.results.length > 0) {
+                const items = response.results.map(ban => {
+                    const statusBadge = ban.ban_type === 'permanent' ? 
+                        '<span class="badge bg-danger">Permanente</span>' : 
+                        '<span class="badge bg-warning">Temporário</span>';
                     
-                    if (ban.time_remaining) {
-                        expirationInfo += `<br><strong>Tempo restante:</strong> ${ban.time_remaining}`;
+                    let expirationInfo = '';
+                    if (ban.expires_at) {
+                        const expiresAt = new Date(ban.expires_at);
+                        expirationInfo = `<br><strong>Expira:</strong> ${expiresAt.toLocaleString('pt-BR')}`;
+                        
+                        if (ban.time_remaining) {
+                            expirationInfo += `<br><strong>Tempo restante:</strong> ${formatTimeRemaining(ban.time_remaining)}`;
+                        }
                     }
-                }
-                
-                searchResult.innerHTML = `
-                    <div class="alert alert-danger">
-                        <h6><i class="fas fa-ban me-2"></i>Jogador Banido</h6>
-                        <strong>Motivo:</strong> ${ban.reason}<br>
-                        <strong>Tipo:</strong> ${statusBadge}<br>
-                        <strong>Banido por:</strong> ${ban.banned_by}<br>
-                        <strong>Data:</strong> ${new Date(ban.created_at).toLocaleString('pt-BR')}
-                        ${expirationInfo}
-                    </div>
-                `;
+                    
+                    return `
+                        <div class="alert alert-danger mb-2">
+                            <h6><i class="fas fa-ban me-2"></i><code>${escapeHtml(ban.player_id)}</code>
+                                ${ban.player_name ? `<small class="text-muted">${escapeHtml(ban.player_name)}</small>` : ''}
+                            </h6>
+                            <strong>Motivo:</strong> ${escapeHtml(ban.reason)}<br>
+                            <strong>Tipo:</strong> ${statusBadge}<br>
+                            <strong>Banido por:</strong> ${escapeHtml(ban.banned_by)}<br>
+                            <strong>Data:</strong> ${new Date(ban.created_at).toLocaleString('pt-BR')}
+                            ${expirationInfo}
+                        </div>
+                    `;
+                });
+                searchResult.innerHTML = items.join('');
             } else {
                 searchResult.innerHTML = `
                     <div class="alert alert-success">
-                        <i class="fas fa-check-circle me-2"></i>Jogador não está banido
-                        <br><small class="text-muted">ID: ${searchTerm}</small>
+                        <i class="fas fa-check-circle me-2"></i>Nenhum jogador banido encontrado
+                        <br><small class="text-muted">Busca: ${escapeHtml(searchTerm)}</small>
                     </div>
                 `;
             }
         } else {
-            searchResult.innerHTML = `<div class="alert alert-danger">Erro: ${response.error}</div>`;
+            searchResult.innerHTML = `<div class="alert alert-danger">Erro: ${escapeHtml(response.error)}</div>`;
         }
     } catch (error) {
         searchResult.innerHTML = '<div class="alert alert-danger">Erro ao buscar jogador</div>';
@@ -316,62 +578,20 @@ async function searchPlayer() {
 }
 
 /**
- * Export bans functionality
- */
-function exportBans() {
-    showToast('Preparando exportação...', 'info');
-    
-    GameBanAPI.getAllBans().then(response => {
-        if (response.success && response.bans) {
-            const csvContent = generateCSV(response.bans);
-            downloadCSV(csvContent, 'bans_export.csv');
-            showToast('Bans exportados com sucesso!', 'success');
-        } else {
-            showToast('Erro ao exportar bans', 'error');
-        }
-    }).catch(error => {
-        showToast('Erro ao exportar bans', 'error');
-    });
-}
-
-/**
- * Generate CSV content from bans data
+ * Escape text before inserting it into HTML
  */
-function generateCSV(bans) {
-    const headers = ['ID', 'Player ID', 'Player Name', 'Reason', 'Ban Type', 'Created At', 'Expires At', 'Banned By'];
-    const rows = [headers.join(',')];
-    
-    bans.forEach(ban => {
-        const row = [
-            ban.id,
-            `"${ban.player_id}"`,
-            `"${ban.player_name || ''}"`,
-            `"${ban.reason.replace(/"/g, '""')}"`,
-            ban.ban_type,
-            `"${new Date(ban.created_at).toLocaleString('pt-BR')}"`,
-            ban.expires_at ? `"${new Date(ban.expires_at).toLocaleString('pt-BR')}"` : '',
-            `"${ban.banned_by}"`
-        ];
-        rows.push(row.join(','));
-    });
-    
-    return rows.join('\n');
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text == null ? '' : String(text);
+    return div.innerHTML;
 }
 
 /**
- * Download CSV file
+ * Export bans functionality (streamed by the server as CSV or NDJSON)
  */
-function downloadCSV(content, filename) {
-    const blob = new Blob([content], { type: 'text/csv;charset=utf-8;' });
-    const link = document.createElement('a');
-    
-    if (link.download !== undefined) {
-        const url = URL.createObjectURL(blob);
-        link.setAttribute('href', url);
-        link.setAttribute('download', filename);
-        link.style.visibility = 'hidden';
-        document.body.appendChild(link);
-        link.click();
-        document.body.removeChild(link);
-    }
+function exportBans(format = 'csv') {
+    // The browser saves the file as it arrives instead of building it in memory
+    const params = new URLSearchParams({ format: format });
+    window.location.href = `${GameBanAPI.baseUrl}/api/bans/export?${params}`;
+    showToast('Exportação iniciada', 'info');
 }
\ No newline at end of file